@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+from common.dataset import DATA_ROOT, raw_folder, processed_folder, figs_folder
+from run_pipeline import expand, select_stages
+from generate_data import parse_size, generate_dataset
+
+# ==== 分规模基准测试 ====
+# 对每个规模（100MB / 1GB / 10GB）用 generate_data.py 生成合成数据集 bench_<规模>（已存在且参数一致时复用），
+# 然后按依赖顺序逐个运行流水线阶段（阶段之间串行，避免互相干扰），记录：
+#   耗时、输入数据量与吞吐（MB/s）、子进程峰值内存（ru_maxrss）
+# 结果追加到 ../data/benchmark_baseline.jsonl（每行一条记录），并与同一规模、同一阶段的上一次结果比较，
+# 耗时或峰值内存超出 tolerance 时标记为退化。
+# 各阶段脚本自带的缓存（z-score 统计、质量特征、频繁项集、商品目录索引）都在处理结果目录或数据目录中，
+# 默认在每个规模开始前清空，测得的是冷启动时间；--warm 时保留
+SCALES = ['100MB', '1GB', '10GB']
+BASELINE_PATH = os.path.normpath(os.path.join(ROOT, 'code_1', DATA_ROOT, 'benchmark_baseline.jsonl'))
+
+
+# ==== 准备某一规模的数据集，返回 (数据集名称, 数据集描述) ====
+def prepare_dataset(scale, seed=0, workers=None):
+    dataset = f"bench_{scale}"
+    folder = os.path.normpath(os.path.join(ROOT, 'code_1', raw_folder(dataset)))
+    info_path = os.path.join(folder, 'dataset.json')
+    if os.path.exists(info_path):
+        with open(info_path, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        if info.get('target_bytes') == parse_size(scale) and info.get('seed') == seed:
+            return dataset, info
+    print(f"[{scale}] 生成合成数据集：{folder}")
+    return dataset, generate_dataset(folder, parse_size(scale), seed=seed, workers=workers)
+
+
+# ==== 清空合成数据集的处理结果与缓存（只清空 bench_ 数据集的派生目录，原始数据保留） ====
+def clear_outputs(dataset):
+    for folder in (processed_folder(dataset), figs_folder(dataset)):
+        path = os.path.normpath(os.path.join(ROOT, 'code_1', folder))
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+    index_path = os.path.normpath(os.path.join(ROOT, 'code_1', raw_folder(dataset), 'product_catalog.index.npz'))
+    if os.path.exists(index_path):
+        os.remove(index_path)
+
+
+# ==== 运行单个阶段，返回 (是否成功, 耗时, 峰值内存字节数) ====
+# os.wait4 返回子进程（含其已回收的工作进程）的资源使用情况，ru_maxrss 是其中单个进程的最大值，
+# 多进程阶段的总内存约为 峰值 × 进程数；ru_maxrss 在 Linux 上单位为 KB，在 macOS 上为字节
+def measure_stage(stage, dataset, log_path):
+    env = dict(os.environ, DATASET=dataset, MPLBACKEND='Agg')
+    start = time.time()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        proc = subprocess.Popen([sys.executable, stage['script']], cwd=os.path.join(ROOT, stage['cwd']),
+                                env=env, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.time() - start
+    peak = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return proc.returncode == 0, elapsed, peak
+
+
+# ==== 阶段的输入数据量（只统计数据文件，不含源码） ====
+def input_bytes(stage, dataset):
+    files = {path for template in stage['inputs'] for path in expand(template, dataset)}
+    return sum(os.path.getsize(path) for path in files)
+
+
+# ==== 读取基准文件中每个 (规模, 阶段, 是否保留缓存) 的最近一次成功记录 ====
+def load_baseline(path):
+    latest = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record.get('ok'):
+                        latest[(record['scale'], record['stage'], record.get('warm', False))] = record
+    return latest
+
+
+# ==== 与上一次记录比较，返回退化说明列表 ====
+def compare(record, previous, tolerance):
+    if previous is None or not record['ok']:
+        return []
+    notes = []
+    for key, label in (('seconds', '耗时'), ('peak_rss_mb', '峰值内存')):
+        if previous[key] > 0 and record[key] > previous[key] * (1 + tolerance):
+            notes.append(f"{label} {previous[key]:.2f} -> {record[key]:.2f}（+{record[key] / previous[key] - 1:.0%}）")
+    return notes
+
+
+# ==== 运行一个规模的全部阶段 ====
+def benchmark_scale(scale, stages, baseline, run_id, tolerance, seed=0, workers=None, warm=False):
+    dataset, info = prepare_dataset(scale, seed=seed, workers=workers)
+    if not warm:
+        clear_outputs(dataset)
+    log_dir = os.path.normpath(os.path.join(ROOT, 'code_1', DATA_ROOT, '.benchmark', dataset))
+    os.makedirs(log_dir, exist_ok=True)
+    records = []
+    failed = set()
+    for stage in stages:
+        name = stage['name']
+        if any(d in failed for d in stage['deps']):
+            failed.add(name)
+            print(f"[{scale}] [{name}] 上游阶段失败，跳过")
+            continue
+        size = input_bytes(stage, dataset)
+        ok, elapsed, peak = measure_stage(stage, dataset, os.path.join(log_dir, f"{name}.log"))
+        record = {
+            'run_id': run_id, 'scale': scale, 'dataset': dataset, 'stage': name, 'ok': ok, 'warm': warm,
+            'rows': info['rows'], 'input_mb': round(size / 1024 ** 2, 2), 'seconds': round(elapsed, 3),
+            'throughput_mb_s': round(size / 1024 ** 2 / elapsed, 2) if elapsed > 0 else None,
+            'peak_rss_mb': round(peak / 1024 ** 2, 1),
+            'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+        }
+        record['regressions'] = compare(record, baseline.get((scale, name, warm)), tolerance)
+        records.append(record)
+        if ok:
+            print(f"[{scale}] [{name}] {elapsed:.2f} 秒，输入 {record['input_mb']} MB，"
+                  f"{record['throughput_mb_s']} MB/s，峰值内存 {record['peak_rss_mb']} MB")
+            for note in record['regressions']:
+                print(f"[{scale}] [{name}] 性能退化：{note}")
+        else:
+            failed.add(name)
+            print(f"[{scale}] [{name}] 失败，日志：{os.path.join(log_dir, name + '.log')}")
+    return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="在不同规模的合成数据上对流水线各阶段做基准测试")
+    parser.add_argument('stages', nargs='*', help="只测试这些阶段（及其上游阶段），缺省时测试全部")
+    parser.add_argument('--scales', nargs='+', default=SCALES, help="数据规模，如 100MB 1GB 10GB")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="基准结果文件（JSON Lines，追加写入）")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="超出上一次结果多少比例视为退化")
+    parser.add_argument('--warm', action='store_true', help="保留上一次运行的处理结果与缓存")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="生成数据时的进程数")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    stages = select_stages(args.stages)
+    baseline = load_baseline(args.baseline)
+    run_id = time.strftime('%Y-%m-%d %H:%M:%S')
+    records = []
+    for scale in args.scales:
+        records.extend(benchmark_scale(scale, stages, baseline, run_id, args.tolerance,
+                                       seed=args.seed, workers=args.workers, warm=args.warm))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+    with open(args.baseline, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    print(f"\n结果已追加到 {args.baseline}")
+
+    regressions = [r for r in records if r['regressions']]
+    if regressions:
+        print(f"共 {len(regressions)} 个阶段出现性能退化：")
+        for r in regressions:
+            print(f"  {r['scale']:<6} {r['stage']:<14} {'；'.join(r['regressions'])}")
+    print(f"总耗时{time.time() - start_time:.2f} 秒")
+    if any(not r['ok'] for r in records) or regressions:
+        sys.exit(1)
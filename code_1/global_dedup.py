@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from tqdm import tqdm
+
+
+# ========= 跨文件 id 去重（哈希分区溢写，内存有界） =========
+# 第一遍：按文件顺序读取 id 列，按 hash(id) 分区写入溢写文件
+# 第二遍：逐分区判断重复，保留全局第一次出现（文件按名称排序、文件内按行序）
+# 结果为每个文件一个 keep 掩码（.npy，可内存映射），供 preprocess_parquet 使用
+
+
+def _partition_of(ids, num_partitions):
+    return (pd.util.hash_array(ids) % num_partitions).astype(np.int64)
+
+
+# ========= 函数：第一遍，id 分区溢写 =========
+def spill_ids(file_paths, work_dir, num_partitions, batch_size=1_000_000):
+    row_counts = []
+    for file_idx, file_path in enumerate(tqdm(file_paths, desc="id 分区溢写")):
+        parts = [[] for _ in range(num_partitions)]
+        offset = 0
+        for batch in pq.ParquetFile(file_path).iter_batches(columns=['id'], batch_size=batch_size):
+            ids = batch.column(0).to_numpy(zero_copy_only=False)
+            rows = np.arange(offset, offset + len(ids), dtype=np.int64)
+            offset += len(ids)
+            part = _partition_of(ids, num_partitions)
+            order = np.argsort(part, kind='stable')
+            bounds = np.searchsorted(part[order], np.arange(num_partitions + 1))
+            for p in range(num_partitions):
+                sel = order[bounds[p]:bounds[p + 1]]
+                if len(sel):
+                    parts[p].append((ids[sel], rows[sel]))
+        for p, chunks in enumerate(parts):
+            if not chunks:
+                continue
+            part_dir = os.path.join(work_dir, f"part_{p:04d}")
+            os.makedirs(part_dir, exist_ok=True)
+            np.save(os.path.join(part_dir, f"{file_idx:06d}_id.npy"),
+                    np.concatenate([c[0] for c in chunks]), allow_pickle=True)
+            np.save(os.path.join(part_dir, f"{file_idx:06d}_row.npy"),
+                    np.concatenate([c[1] for c in chunks]))
+        row_counts.append(offset)
+    return row_counts
+
+
+# ========= 函数：第二遍，逐分区标记重复行 =========
+def mark_duplicates(work_dir, mask_paths, row_counts, num_partitions):
+    masks = []
+    for mask_path, n in zip(mask_paths, row_counts):
+        mask = np.lib.format.open_memmap(mask_path, mode='w+', dtype=np.bool_, shape=(n,))
+        mask[:] = True
+        masks.append(mask)
+
+    total_duplicates = 0
+    for p in tqdm(range(num_partitions), desc="分区去重"):
+        part_dir = os.path.join(work_dir, f"part_{p:04d}")
+        if not os.path.isdir(part_dir):
+            continue
+        # 文件名按 file_idx 排序，拼接后的顺序即全局的文件顺序 + 行顺序
+        stems = sorted({f[:-len('_id.npy')] for f in os.listdir(part_dir) if f.endswith('_id.npy')})
+        ids, rows, files = [], [], []
+        for stem in stems:
+            part_ids = np.load(os.path.join(part_dir, f"{stem}_id.npy"), allow_pickle=True)
+            ids.append(part_ids)
+            rows.append(np.load(os.path.join(part_dir, f"{stem}_row.npy")))
+            files.append(np.full(len(part_ids), int(stem), dtype=np.int64))
+        ids, rows, files = np.concatenate(ids), np.concatenate(rows), np.concatenate(files)
+
+        dup = pd.Series(ids).duplicated(keep='first').to_numpy()
+        total_duplicates += int(dup.sum())
+        for file_idx in np.unique(files[dup]):
+            masks[file_idx][rows[dup & (files == file_idx)]] = False
+        shutil.rmtree(part_dir)
+
+    for mask in masks:
+        mask.flush()
+    return total_duplicates
+
+
+# ========= 函数：分批读取并去重（流式模式） =========
+# 逐批返回 (原始记录数, 去重后的 DataFrame)，按 keep 掩码过滤。
+# 未给定掩码（只做文件内去重）时，先对本文件单独执行一次分区溢写去重，得到临时掩码（写在 work_dir 下，
+# 缺省为系统临时目录，读完后删除），内存只与批次大小有关，而不是在内存中保存全部 id
+def iter_deduplicated_batches(file_path, keep_mask_path=None, batch_size=500_000, work_dir=None,
+                              num_partitions=16):
+    tmp_dir = None
+    if keep_mask_path is None:
+        tmp_dir = tempfile.mkdtemp(prefix='dedup_', dir=work_dir)
+        (keep_mask_path,), _ = build_keep_masks([file_path], tmp_dir, num_partitions)
+    try:
+        keep_mask = np.load(keep_mask_path, mmap_mode='r')
+        offset = 0
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=batch_size):
+            df = batch.to_pandas()
+            n = len(df)
+            df = df[keep_mask[offset:offset + n]]
+            offset += n
+            yield n, df
+    finally:
+        if tmp_dir is not None:
+            keep_mask = None
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+# ========= 函数：对整个输入文件夹执行跨文件去重 =========
+# 返回 (每个文件的 keep 掩码路径列表, 全局重复记录数)
+def build_keep_masks(file_paths, work_dir, num_partitions=64):
+    os.makedirs(work_dir, exist_ok=True)
+    mask_paths = [
+        os.path.join(work_dir, f"{os.path.splitext(os.path.basename(fp))[0]}_keep.npy")
+        for fp in file_paths
+    ]
+    row_counts = spill_ids(file_paths, work_dir, num_partitions)
+    total_duplicates = mark_duplicates(work_dir, mask_paths, row_counts, num_partitions)
+    return mask_paths, total_duplicates
@@ -0,0 +1,70 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from global_dedup import iter_deduplicated_batches
+from moments import empty_moments, batch_moments, merge_moments, mean_std
+
+# ========= 全局 Z-score 统计（第一遍） =========
+# 在去重、删除缺失值之后的同一批记录上统计 age、income 的 (count, mean, M2)，
+# 结果写入一个小的 json 文件，输入文件不变时直接复用
+zscore_columns = ['age', 'income']
+
+
+# ========= 函数：计算输入文件指纹（文件名、大小、修改时间 + 额外配置） =========
+def input_fingerprint(file_paths, extra=None):
+    h = hashlib.sha256()
+    for fp in file_paths:
+        st = os.stat(fp)
+        h.update(f"{os.path.basename(fp)}|{st.st_size}|{st.st_mtime_ns}\n".encode('utf-8'))
+    h.update(json.dumps(extra or {}, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+# ========= 函数：流式统计单个文件的矩 =========
+def file_moments(file_path, keep_mask_path, batch_size):
+    moments = {col: empty_moments() for col in zscore_columns}
+    # 删除缺失值需要检查所有列，因此这里读取全部列
+    for _, df in iter_deduplicated_batches(file_path, keep_mask_path, batch_size):
+        df = df.dropna()
+        for col in zscore_columns:
+            moments[col] = merge_moments(moments[col], batch_moments(df[col]))
+    return moments
+
+
+def _file_moments_task(args):
+    return file_moments(*args)
+
+
+# ========= 函数：读取缓存的统计结果，或重新计算并保存 =========
+# 返回 {列名: (mean, std)}
+def load_or_compute_bounds(file_paths, mask_paths, sidecar_path, batch_size, workers=1, extra=None):
+    fingerprint = input_fingerprint(file_paths, extra)
+    if os.path.exists(sidecar_path):
+        with open(sidecar_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('fingerprint') == fingerprint:
+            print(f"输入未变化，复用全局统计：{sidecar_path}")
+            return {col: (v['mean'], v['std']) for col, v in cached['columns'].items()}
+
+    tasks = [(fp, mp, batch_size) for fp, mp in zip(file_paths, mask_paths)]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            per_file = list(executor.map(_file_moments_task, tasks))
+    else:
+        per_file = [_file_moments_task(t) for t in tasks]
+
+    # 按文件顺序合并，保证结果与串行一致
+    total = {col: empty_moments() for col in zscore_columns}
+    for moments in per_file:
+        for col in zscore_columns:
+            total[col] = merge_moments(total[col], moments[col])
+
+    columns = {}
+    for col in zscore_columns:
+        count, mean, m2 = total[col]
+        _, std = mean_std(total[col])
+        columns[col] = {'count': count, 'mean': mean, 'm2': m2, 'std': float(std)}
+    with open(sidecar_path, 'w', encoding='utf-8') as f:
+        json.dump({'fingerprint': fingerprint, 'columns': columns}, f, ensure_ascii=False, indent=2)
+    return {col: (v['mean'], v['std']) for col, v in columns.items()}
@@ -0,0 +1,43 @@
+import numpy as np
+
+
+# ========= 可合并的一阶、二阶矩 (count, mean, M2) =========
+# 用于分批/分文件统计均值与标准差，合并结果与一次性计算一致
+
+
+def empty_moments():
+    return (0, 0.0, 0.0)
+
+
+# ========= 函数：计算一批数值的矩 =========
+def batch_moments(values):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    n = len(values)
+    if n == 0:
+        return empty_moments()
+    mean = float(values.mean())
+    m2 = float(((values - mean) ** 2).sum())
+    return (n, mean, m2)
+
+
+# ========= 函数：合并两组矩（Chan 并行算法） =========
+def merge_moments(a, b):
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    if n == 0:
+        return empty_moments()
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta * delta * n_a * n_b / n
+    return (n, mean, m2)
+
+
+# ========= 函数：由矩得到均值与样本标准差（ddof=1，与 pandas 一致） =========
+def mean_std(moments):
+    n, mean, m2 = moments
+    if n == 0:
+        return np.nan, np.nan
+    std = np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+    return mean, std
@@ -3,14 +3,57 @@ import numpy as np
 import os
 import time
 import gc
+import shutil
 from tqdm import tqdm
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import pyarrow as pa
+import pyarrow.parquet as pq
+import sys
+from global_dedup import build_keep_masks, iter_deduplicated_batches
+from global_stats import load_or_compute_bounds
+from moments import empty_moments, batch_moments, merge_moments, mean_std
 
-# ========= 配置路径 =========
-input_folder = '../data/30G_data'
-output_folder = '../data/processed_30G_data'
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.dataset import dataset_size, raw_folder, processed_folder, worker_count, memory_budget
+
+# ========= 配置路径（数据集规模可由环境变量 DATASET 指定） =========
+dataset = dataset_size('30G')
+input_folder = raw_folder(dataset)
+output_folder = processed_folder(dataset)
 os.makedirs(output_folder, exist_ok=True)
 
+# ========= 并行配置 =========
+# num_workers = 1 时退化为逐文件串行处理；由 run_pipeline.py 运行时使用其分配的进程数与内存预算
+num_workers = worker_count()
+# 所有并发文件预估内存之和的上限（GB）
+memory_budget_gb = memory_budget(16)
+# 单个文件处理时的内存放大系数（相对于 parquet 未压缩大小）
+memory_factor = 3.0
+
+# ========= 输出格式配置 =========
+# 'parquet' 保留列类型与时间字段，下游脚本可按列读取；'csv' 为旧格式
+output_format = 'parquet'
+parquet_compression = 'zstd'
+row_group_size = 500_000
+
+# ========= 流式处理配置 =========
+# True 时按 record batch 分批读取、清洗并增量写出，峰值内存由 batch_size 决定而非文件大小
+streaming = True
+streaming_batch_size = 500_000
+
+# ========= 去重配置 =========
+# True 时按 id 跨文件全局去重（按文件名顺序保留第一次出现），False 时仅文件内去重
+global_dedup = True
+dedup_partitions = 64
+dedup_work_dir = os.path.join(output_folder, '_dedup')
+
+# ========= 异常值检测配置 =========
+# True 时先流式统计全数据集的 age、income 均值与标准差（保存在 zscore_stats_path，输入不变时复用），
+# 再用同一组阈值过滤所有文件；False 时沿用逐文件统计
+global_zscore = True
+zscore_stats_path = os.path.join(output_folder, 'zscore_stats.json')
+
 # ========= 初始化全局统计 =========
 total_stats = {
     'original_rows': 0,
@@ -24,7 +67,7 @@ total_start = time.time()
 
 
 # ========= 函数：处理单个 parquet 文件 =========
-def preprocess_parquet(file_path, output_path, index, total_files):
+def preprocess_parquet(file_path, output_path, index, total_files, keep_mask_path=None, zscore_bounds=None):
     local_stats = {}
     start_time = time.time()
     file_name = os.path.basename(file_path)
@@ -40,7 +83,10 @@ def preprocess_parquet(file_path, output_path, index, total_files):
     # Step 2: 去重
     print("正在去重...")
     before = len(df)
-    df.drop_duplicates(subset=['id'], keep='first', inplace=True)
+    if keep_mask_path is not None:
+        df = df[np.load(keep_mask_path, mmap_mode='r')]
+    else:
+        df.drop_duplicates(subset=['id'], keep='first', inplace=True)
     removed = before - len(df)
     local_stats['deduplicated'] = removed
     print(f"去重完成，去除 {removed} 条")
@@ -56,9 +102,13 @@ def preprocess_parquet(file_path, output_path, index, total_files):
     # Step 4: 异常值删除（Z-score）
     print("正在检测并删除异常值...")
     before = len(df)
-    for col in ['age', 'income']:
-        z = (df[col] - df[col].mean()) / df[col].std()
-        df = df[np.abs(z) <= 3]
+    if zscore_bounds is not None:
+        for col, (mean, std) in zscore_bounds.items():
+            df = df[np.abs((df[col] - mean) / std) <= 3]
+    else:
+        for col in ['age', 'income']:
+            z = (df[col] - df[col].mean()) / df[col].std()
+            df = df[np.abs(z) <= 3]
     removed = before - len(df)
     local_stats['outliers_removed'] = removed
     print(f"删除异常值记录 {removed} 条")
@@ -69,47 +119,208 @@ def preprocess_parquet(file_path, output_path, index, total_files):
     df['registration_date'] = pd.to_datetime(df['registration_date'], errors='coerce')
     print("时间字段转换完成")
 
-    # Step 6: 保存 CSV
-    print("正在保存为 CSV 文件...")
-    df.to_csv(output_path, index=False)
+    # Step 6: 保存结果
+    if output_format == 'parquet':
+        print("正在保存为 Parquet 文件...")
+        df.to_parquet(output_path, index=False, compression=parquet_compression, row_group_size=row_group_size)
+    else:
+        print("正在保存为 CSV 文件...")
+        df.to_csv(output_path, index=False)
     local_stats['final'] = len(df)
     print(f"保存完成，剩余记录数：{len(df)}")
 
     del df
     gc.collect()
 
-    step_times[file_name] = time.time() - start_time
-    print(f"文件处理完成，用时：{step_times[file_name]:.2f} 秒")
+    # 耗时随结果返回，由主进程统一写入 step_times（子进程中的修改不会回传）
+    local_stats['time'] = time.time() - start_time
+    print(f"文件处理完成，用时：{local_stats['time']:.2f} 秒")
     return local_stats
 
 
-# ========= 主处理流程 =========
-parquet_files = sorted([f for f in os.listdir(input_folder) if f.endswith('.parquet')])
-print(f"共检测到 {len(parquet_files)} 个 parquet 文件")
+# ========= 函数：流式处理单个 parquet 文件 =========
+# 未给定全局阈值时，前两遍只计算本文件 age、income 的矩
+# （income 在 age 过滤后的数据上统计，与 preprocess_parquet 一致），最后一遍清洗并增量写出
+def preprocess_parquet_streaming(file_path, output_path, index, total_files, keep_mask_path=None,
+                                 zscore_bounds=None):
+    local_stats = {'original': 0, 'deduplicated': 0, 'missing_dropped': 0, 'outliers_removed': 0, 'final': 0}
+    start_time = time.time()
+    file_name = os.path.basename(file_path)
+
+    print(f"\n[{index}/{total_files}] 开始流式处理文件：{file_name}")
+
+    # Pass 1 / 2: 统计异常值检测所需的均值与标准差
+    bounds = zscore_bounds
+    if bounds is None:
+        print("正在统计异常值检测参数...")
+        bounds = {}
+        for col in ['age', 'income']:
+            moments = empty_moments()
+            for _, df in iter_deduplicated_batches(file_path, keep_mask_path, streaming_batch_size):
+                df = df.dropna()
+                for prev_col, (mean, std) in bounds.items():
+                    df = df[np.abs((df[prev_col] - mean) / std) <= 3]
+                moments = merge_moments(moments, batch_moments(df[col]))
+            bounds[col] = mean_std(moments)
+
+    # Pass 3: 清洗并增量写出
+    print("正在清洗并写出数据...")
+    writer = None
+    header = True
+    empty_df = pd.DataFrame()
+    for n, df in iter_deduplicated_batches(file_path, keep_mask_path, streaming_batch_size):
+        local_stats['original'] += n
+        local_stats['deduplicated'] += n - len(df)
+
+        before = len(df)
+        df = df.dropna()
+        local_stats['missing_dropped'] += before - len(df)
+
+        before = len(df)
+        for col, (mean, std) in bounds.items():
+            df = df[np.abs((df[col] - mean) / std) <= 3]
+        local_stats['outliers_removed'] += before - len(df)
+
+        df = df.copy()
+        df['last_login'] = pd.to_datetime(df['last_login'], errors='coerce')
+        df['registration_date'] = pd.to_datetime(df['registration_date'], errors='coerce')
+
+        empty_df = df.iloc[:0]
+        if len(df) == 0:
+            continue
+        if output_format == 'parquet':
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema, compression=parquet_compression)
+            else:
+                table = table.cast(writer.schema)
+            writer.write_table(table, row_group_size=row_group_size)
+        else:
+            df.to_csv(output_path, index=False, header=header, mode='w' if header else 'a')
+            header = False
+        local_stats['final'] += len(df)
 
-for idx, file in enumerate(parquet_files, 1):
-    file_path = os.path.join(input_folder, file)
-    output_csv = os.path.join(output_folder, f"{os.path.splitext(file)[0]}_processed.csv")
+    # 没有任何记录留下时，写出一个只有表头的空文件
+    if writer is not None:
+        writer.close()
+    elif header:
+        if output_format == 'parquet':
+            empty_df.to_parquet(output_path, index=False, compression=parquet_compression)
+        else:
+            empty_df.to_csv(output_path, index=False)
+    print(f"保存完成，原始记录数：{local_stats['original']}，剩余记录数：{local_stats['final']}")
+
+    local_stats['time'] = time.time() - start_time
+    print(f"文件处理完成，用时：{local_stats['time']:.2f} 秒")
+    return local_stats
+
+
+# ========= 函数：预估单个文件处理所需内存（字节） =========
+def estimate_file_memory(file_path):
+    try:
+        meta = pq.ParquetFile(file_path).metadata
+        raw_size = sum(meta.row_group(i).total_byte_size for i in range(meta.num_row_groups))
+        # 流式模式下只有一个批次常驻内存
+        if streaming and meta.num_rows > streaming_batch_size:
+            raw_size = raw_size * streaming_batch_size // meta.num_rows
+    except Exception:
+        raw_size = os.path.getsize(file_path)
+    return int(raw_size * memory_factor)
 
-    stats = preprocess_parquet(file_path, output_csv, idx, len(parquet_files))
 
+# ========= 函数：合并单个文件的统计结果 =========
+def merge_stats(file_name, stats):
     total_stats['original_rows'] += stats['original']
     total_stats['deduplicated_rows'] += stats['deduplicated']
     total_stats['missing_dropped'] += stats['missing_dropped']
     total_stats['outliers_removed'] += stats['outliers_removed']
     total_stats['final_rows'] += stats['final']
+    step_times[file_name] = stats['time']
+
+
+# ========= 函数：进程池并行处理，按内存预算限制并发文件数 =========
+def run_parallel(process_func, tasks, workers, budget_bytes, zscore_bounds=None):
+    results = {}
+    pending = list(tasks)
+    running = {}
+    in_flight = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            # 在进程数和内存预算允许的范围内提交任务，至少保证有一个文件在处理
+            while pending and len(running) < workers:
+                need = pending[0][-1]
+                if running and in_flight + need > budget_bytes:
+                    break
+                file_name, file_path, output_path, index, total, mask_path, need = pending.pop(0)
+                future = executor.submit(process_func, file_path, output_path, index, total, mask_path, zscore_bounds)
+                running[future] = (file_name, need)
+                in_flight += need
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_name, need = running.pop(future)
+                in_flight -= need
+                results[file_name] = future.result()
+    return results
+
+
+# ========= 主处理流程 =========
+if __name__ == '__main__':
+    parquet_files = sorted([f for f in os.listdir(input_folder) if f.endswith('.parquet')])
+    print(f"共检测到 {len(parquet_files)} 个 parquet 文件")
+
+    file_paths = [os.path.join(input_folder, file) for file in parquet_files]
+    mask_paths = [None] * len(parquet_files)
+    global_duplicates = None
+    if global_dedup:
+        print("正在进行跨文件 id 去重...")
+        mask_paths, global_duplicates = build_keep_masks(file_paths, dedup_work_dir, dedup_partitions)
+        print(f"跨文件去重完成，共发现重复记录 {global_duplicates} 条")
+
+    workers = max(1, min(num_workers, len(parquet_files)))
+    zscore_bounds = None
+    if global_zscore:
+        print("正在统计全局异常值检测参数...")
+        fingerprint_extra = {'global_dedup': global_dedup}
+        zscore_bounds = load_or_compute_bounds(file_paths, mask_paths, zscore_stats_path,
+                                               streaming_batch_size, workers, fingerprint_extra)
+        for col, (mean, std) in zscore_bounds.items():
+            print(f" - {col}: mean={mean:.4f}, std={std:.4f}")
+
+    tasks = []
+    for idx, (file, file_path, mask_path) in enumerate(zip(parquet_files, file_paths, mask_paths), 1):
+        output_path = os.path.join(output_folder, f"{os.path.splitext(file)[0]}_processed.{output_format}")
+        tasks.append((file, file_path, output_path, idx, len(parquet_files), mask_path,
+                      estimate_file_memory(file_path)))
+
+    process_func = preprocess_parquet_streaming if streaming else preprocess_parquet
+    if workers == 1:
+        results = {}
+        for file, file_path, output_path, idx, total, mask_path, _ in tasks:
+            results[file] = process_func(file_path, output_path, idx, total, mask_path, zscore_bounds)
+    else:
+        print(f"并行模式：{workers} 个进程，内存预算 {memory_budget_gb} GB")
+        results = run_parallel(process_func, tasks, workers, memory_budget_gb * 1024 ** 3, zscore_bounds)
+
+    # 按文件顺序合并，保证与串行运行结果一致
+    for file in parquet_files:
+        merge_stats(file, results[file])
+    if global_duplicates is not None:
+        assert total_stats['deduplicated_rows'] == global_duplicates, "去重统计与跨文件去重结果不一致"
+        shutil.rmtree(dedup_work_dir, ignore_errors=True)
 
-# ========= 总结统计输出 =========
-total_time = time.time() - total_start
+    # ========= 总结统计输出 =========
+    total_time = time.time() - total_start
 
-print("\n处理完成，总体数据统计如下：")
-print(f"原始总数据量: {total_stats['original_rows']}")
-print(f"去重记录总数: {total_stats['deduplicated_rows']}")
-print(f"删除缺失值记录总数: {total_stats['missing_dropped']}")
-print(f"删除异常值记录总数: {total_stats['outliers_removed']}")
-print(f"最终保留总记录数: {total_stats['final_rows']}")
-print(f"\n总耗时: {total_time:.2f} 秒")
+    print("\n处理完成，总体数据统计如下：")
+    print(f"原始总数据量: {total_stats['original_rows']}")
+    print(f"去重记录总数: {total_stats['deduplicated_rows']}")
+    print(f"删除缺失值记录总数: {total_stats['missing_dropped']}")
+    print(f"删除异常值记录总数: {total_stats['outliers_removed']}")
+    print(f"最终保留总记录数: {total_stats['final_rows']}")
+    print(f"\n总耗时: {total_time:.2f} 秒")
 
-print("\n每个文件的耗时（秒）：")
-for file, sec in step_times.items():
-    print(f" - {file:<30}: {sec:.2f} 秒")
\ No newline at end of file
+    print("\n每个文件的耗时（秒）：")
+    for file, sec in step_times.items():
+        print(f" - {file:<30}: {sec:.2f} 秒")
\ No newline at end of file
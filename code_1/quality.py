@@ -1,115 +1,194 @@
 import os
 import pandas as pd
-import json
 import numpy as np
 from tqdm import tqdm
 import time
 import gc
+import sys
 
-# ==== 路径配置 ====
-csv_folder = '../data/processed_10G_data'
-csv_files = [f for f in os.listdir(csv_folder) if f.endswith('_processed.csv')]
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.processed_io import list_processed_files, read_processed
+from common.json_fields import decode_json_column
+from common.fingerprint import check_file, load_manifest, save_manifest
+from common.dataset import dataset_size, raw_folder, processed_folder
 
-# ==== JSON 字符串修复函数 ====
-def parse_json_field(raw_str):
-    try:
-        fixed_str = raw_str.replace('""', '"').strip()
-        return json.loads(fixed_str)
-    except Exception:
-        return {}
+# ==== 路径配置（数据集规模可由环境变量 DATASET 指定） ====
+dataset = dataset_size('10G')
+csv_folder = processed_folder(dataset)
+csv_files = list_processed_files(csv_folder)
+score_columns = ['id', 'fullname', 'age', 'income', 'is_active', 'purchase_history', 'login_history']
 
-# ==== 用户质量评分函数 ====
-def compute_score(row):
+# ==== 支付状态权重 ====
+payment_weight = {
+    '已支付': 1.0,
+    '部分退款': 0.5,
+    '已退款': 0.0
+}
+
+# ==== JSON 解析失败计数 ====
+parse_failures = {'purchase_history': 0, 'login_history': 0}
+
+# ==== 用户质量评分函数（按列向量化计算） ====
+def compute_scores(df):
     # 年龄评分
-    age = row['age']
-    if 25 <= age <= 45:
-        age_score = 1
-    elif 20 <= age < 25 or 45 < age <= 55:
-        age_score = 0.7
-    else:
-        age_score = 0.3
-    # 收入评分
-    income = row['income']
+    age = df['age']
+    age_score = np.select(
+        [(age >= 25) & (age <= 45), ((age >= 20) & (age < 25)) | ((age > 45) & (age <= 55))],
+        [1.0, 0.7],
+        default=0.3
+    )
     # 活跃度评分
-    active_score = 1.0 if row['is_active'] else 0.0
+    active_score = df['is_active'].astype(bool).astype(float)
     # 购买评分
-    try:
-        p_hist = parse_json_field(row['purchase_history'])
-        avg_price = float(p_hist.get('avg_price', 0))
-        status = p_hist.get('payment_status', '已退款')
-        payment_weight = {
-            '已支付': 1.0,
-            '部分退款': 0.5,
-            '已退款': 0.0
-        }.get(status, 0.0)
-        purchase_score = avg_price * payment_weight
-    except:
-        purchase_score = 0
+    p_hist, failures = decode_json_column(
+        df['purchase_history'], ['avg_price', 'payment_status'], numeric_fields=['avg_price'],
+        string_fields=['payment_status'])
+    parse_failures['purchase_history'] += failures
+    status = p_hist['payment_status'].fillna('已退款')
+    weight = status.map(payment_weight).fillna(0.0)
+    purchase_score = p_hist['avg_price'].fillna(0) * weight
     # 登录评分
-    try:
-        l_hist = parse_json_field(row['login_history'])
-        login_count = int(l_hist.get('login_count', 0))
-    except:
-        login_count = 0
-    return {
-        'id': row['id'],
-        'fullname': row['fullname'],
+    l_hist, failures = decode_json_column(df['login_history'], ['login_count'], numeric_fields=['login_count'])
+    parse_failures['login_history'] += failures
+    login_count = np.trunc(l_hist['login_count'].fillna(0)).astype(np.int64)
+    return pd.DataFrame({
+        'id': df['id'].to_numpy(),
+        'fullname': df['fullname'].to_numpy(),
         'age_score': age_score,
-        'income': income,
-        'active_score': active_score,
-        'purchase_score': purchase_score,
-        'login_count': login_count
-    }
-
-# ==== 打分阶段 ====
-all_scores = []
+        'income': df['income'].to_numpy(),
+        'active_score': active_score.to_numpy(),
+        'purchase_score': purchase_score.to_numpy(),
+        'login_count': login_count.to_numpy()
+    })
+
+# ==== 归一化与 Top-K 配置 ====
+normalize_columns = ['income', 'login_count', 'purchase_score']
+top_k = 100
+# 第一遍计算出的特征缓存目录，第二遍按文件读取，内存只与单个文件大小有关
+feature_folder = os.path.join(csv_folder, '_quality_features')
+os.makedirs(feature_folder, exist_ok=True)
+# 清单记录每个输入文件的大小、修改时间、内容哈希以及对应特征文件的 min/max，
+# 重新运行时只对新增或变化的文件重新打分；修改打分逻辑时需递增 feature_version
+manifest_path = os.path.join(feature_folder, 'manifest.json')
+feature_version = 1
+
+# 特征文件按完整的输入文件名（含扩展名）命名，x_processed.csv 与 x_processed.parquet 不会共用同一个缓存
+def feature_path_of(file):
+    stem, ext = os.path.splitext(file)
+    return os.path.join(feature_folder, f"{stem}_{ext.lstrip('.')}_features.parquet")
+
+def min_max_normalize(series, col_min, col_max):
+    return (series - col_min) / (col_max - col_min + 1e-6)
+
+# ==== 第一遍：打分（增量）并收集全局 min/max ====
 start_all = time.time()
 start_scoring = time.time()
+manifest = load_manifest(manifest_path)
+if manifest.get('version') != feature_version:
+    manifest = {'version': feature_version, 'files': {}}
+old_entries = manifest['files']
+new_entries = {}
+rescored = 0
 
 print("正在为用户打分并收集特征...")
 for file in tqdm(csv_files, desc="处理文件"):
     file_path = os.path.join(csv_folder, file)
-    df = pd.read_csv(file_path)
+    feature_path = feature_path_of(file)
+    entry = old_entries.get(file)
+    unchanged, file_info = check_file(file_path, entry)
+    if unchanged and os.path.exists(feature_path):
+        new_entries[file] = dict(entry, **file_info)
+        continue
 
-    for _, row in df.iterrows():
-        result = compute_score(row)
-        all_scores.append(result)
+    df = read_processed(file_path, columns=score_columns)
+    before = dict(parse_failures)
+    features = compute_scores(df)
+    features.to_parquet(feature_path, index=False)
+    new_entries[file] = dict(
+        file_info,
+        rows=len(features),
+        min={col: float(features[col].min()) if len(features) else None for col in normalize_columns},
+        max={col: float(features[col].max()) if len(features) else None for col in normalize_columns},
+        parse_failures={k: parse_failures[k] - before[k] for k in parse_failures}
+    )
+    rescored += 1
 
-    del df
+    del df, features
     gc.collect()
 
+# 删除不再对应任何输入文件的特征缓存
+current_features = {os.path.basename(feature_path_of(file)) for file in new_entries}
+for name in os.listdir(feature_folder):
+    if name.endswith('_features.parquet') and name not in current_features:
+        os.remove(os.path.join(feature_folder, name))
+manifest['files'] = new_entries
+save_manifest(manifest_path, manifest)
+
+# 合并各文件的局部 min/max 与统计
+global_min = {col: np.inf for col in normalize_columns}
+global_max = {col: -np.inf for col in normalize_columns}
+total_users = 0
+total_failures = {k: 0 for k in parse_failures}
+for entry in new_entries.values():
+    total_users += entry['rows']
+    for col in normalize_columns:
+        if entry['min'][col] is not None:
+            global_min[col] = min(global_min[col], entry['min'][col])
+            global_max[col] = max(global_max[col], entry['max'][col])
+    for k in total_failures:
+        total_failures[k] += entry['parse_failures'][k]
+feature_files = [feature_path_of(file) for file in csv_files]
+
 end_scoring = time.time()
 scoring_time = end_scoring - start_scoring
-print(f"打分完成，总用户数：{len(all_scores)}，耗时：{scoring_time:.2f} 秒")
+print(f"打分完成，总用户数：{total_users}，重新打分文件数：{rescored}/{len(csv_files)}，耗时：{scoring_time:.2f} 秒")
+print(f"JSON 解析失败：purchase_history {total_failures['purchase_history']} 条，"
+      f"login_history {total_failures['login_history']} 条")
 
-# ==== 数据整理 + 标准化 ====
+# ==== 第二遍：标准化 + 综合得分 + 流式 Top-K ====
 start_calc = time.time()
-score_df = pd.DataFrame(all_scores)
-
-def min_max_normalize(series):
-    return (series - series.min()) / (series.max() - series.min() + 1e-6)
-
-score_df['income_score'] = min_max_normalize(score_df['income'])
-score_df['login_score'] = min_max_normalize(score_df['login_count'])
-score_df['purchase_score_norm'] = min_max_normalize(score_df['purchase_score'])
-
-# 综合得分
-score_df['quality_score'] = (
-    0.15 * score_df['age_score'] +
-    0.25 * score_df['income_score'] +
-    0.15 * score_df['active_score'] +
-    0.25 * score_df['purchase_score_norm'] +
-    0.20 * score_df['login_score']
-)
-
-# ==== 输出 Top 100 用户 ====
-top_100 = score_df.sort_values(by='quality_score', ascending=False).head(100)
+top_df = None
+
+for feature_path in tqdm(feature_files, desc="计算综合得分"):
+    score_df = pd.read_parquet(feature_path)
+    score_df['income_score'] = min_max_normalize(score_df['income'], global_min['income'], global_max['income'])
+    score_df['login_score'] = min_max_normalize(
+        score_df['login_count'], global_min['login_count'], global_max['login_count'])
+    score_df['purchase_score_norm'] = min_max_normalize(
+        score_df['purchase_score'], global_min['purchase_score'], global_max['purchase_score'])
+
+    # 综合得分
+    score_df['quality_score'] = (
+        0.15 * score_df['age_score'] +
+        0.25 * score_df['income_score'] +
+        0.15 * score_df['active_score'] +
+        0.25 * score_df['purchase_score_norm'] +
+        0.20 * score_df['login_score']
+    )
+
+    # 只保留当前文件的前 K 名，再与已有的候选合并，避免全量排序
+    candidates = score_df[['id', 'fullname', 'quality_score']]
+    if top_df is not None:
+        candidates = pd.concat([top_df, candidates], ignore_index=True)
+    if len(candidates) > top_k:
+        scores = candidates['quality_score'].to_numpy()
+        candidates = candidates.iloc[np.argpartition(-scores, top_k - 1)[:top_k]]
+    top_df = candidates.reset_index(drop=True)
+
+    del score_df
+    gc.collect()
+
+# ==== 输出 Top K 用户 ====
+if top_df is None:
+    top_df = pd.DataFrame(columns=['id', 'fullname', 'quality_score'])
+top_users = top_df.sort_values(by='quality_score', ascending=False)
 end_calc = time.time()
 calc_time = end_calc - start_calc
 print(f"得分计算、标准化以及用户排序完成，耗时：{calc_time:.2f} 秒")
-top_100[['id', 'fullname', 'quality_score']].to_csv('../data/10G_data/top100_high_quality_users.csv', index=False)
+top_file = f'top{top_k}_high_quality_users.csv'
+top_users[['id', 'fullname', 'quality_score']].to_csv(os.path.join(raw_folder(dataset), top_file), index=False)
 
 # ==== 总耗时统计 ====
 total_time = time.time() - start_all
-print(f"\n全流程结束，已输出 Top 100 用户：top100_high_quality_users.csv")
+print(f"\n全流程结束，已输出 Top {top_k} 用户：{top_file}")
 print(f"总耗时：{total_time:.2f} 秒")
\ No newline at end of file
@@ -1,24 +1,166 @@
 import pandas as pd
 import os
+import sys
+import time
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
 
-# 设置文件夹路径，假设所有 .parquet 文件都在这个文件夹中
-folder_path = '../data/10G_data'
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.dataset import dataset_size, raw_folder
 
-# 获取所有 .parquet 文件
-parquet_files = [f for f in os.listdir(folder_path) if f.endswith('.parquet')]
+# 设置文件夹路径，假设所有 .parquet 文件都在这个文件夹中（数据集规模可由环境变量 DATASET 指定）
+folder_path = raw_folder(dataset_size('10G'))
 
-# 解析并读取每个 .parquet 文件
-for file in parquet_files:
-    file_path = os.path.join(folder_path, file)
-    # 读取 Parquet 文件
-    df = pd.read_parquet(file_path)
+# ==== 检查模式 ====
+#   footer —— 只读取 parquet footer（schema、行组布局、列统计信息）和第一个行组的前几行，不读取整个文件
+#   full   —— 读取整个文件并打印 info() / head()（旧做法，需要读取全部数据）
+mode = 'footer'
+head_rows = 5
+num_workers = min(32, (os.cpu_count() or 1) * 4)  # 以 I/O 为主，线程数可多于核数
 
-    # 打印 DataFrame 的基本信息
-    print(f"File: {file}")
-    print("DataFrame Info:")
-    print(df.info())
 
-    # 打印 DataFrame 的前几行数据
-    print("First 5 rows of the DataFrame:")
-    print(df.head())
+# ==== 汇总 footer 中某一列在全部行组上的统计信息 ====
+# 任一行组缺少 min/max 时该列的 min/max 记为 None；null 计数同理
+def column_summary(meta, col_idx):
+    compressed = uncompressed = 0
+    lows, highs, nulls = [], [], 0
+    has_min_max = has_nulls = True
+    for i in range(meta.num_row_groups):
+        col = meta.row_group(i).column(col_idx)
+        compressed += col.total_compressed_size
+        uncompressed += col.total_uncompressed_size
+        stats = col.statistics
+        if stats is None or not stats.has_min_max:
+            has_min_max = False
+        else:
+            lows.append(stats.min)
+            highs.append(stats.max)
+        if stats is None or not stats.has_null_count:
+            has_nulls = False
+        else:
+            nulls += stats.null_count
+    return {
+        'column': meta.schema.column(col_idx).path,
+        'type': str(meta.schema.column(col_idx).physical_type),
+        'compressed': compressed,
+        'uncompressed': uncompressed,
+        'min': min(lows) if has_min_max and lows else None,
+        'max': max(highs) if has_min_max and highs else None,
+        'nulls': nulls if has_nulls else None,
+    }
+
+
+# ==== 只读取 footer 与第一个行组，返回单个文件的检查结果 ====
+def inspect_file(file_path):
+    pf = pq.ParquetFile(file_path)
+    meta = pf.metadata
+    row_groups = [
+        {'rows': meta.row_group(i).num_rows,
+         'compressed': sum(meta.row_group(i).column(j).total_compressed_size for j in range(meta.num_columns)),
+         'uncompressed': meta.row_group(i).total_byte_size}
+        for i in range(meta.num_row_groups)
+    ]
+    head = None
+    if meta.num_row_groups:
+        head = pf.read_row_group(0).slice(0, head_rows).to_pandas()
+    return {
+        'file': os.path.basename(file_path),
+        'schema': pf.schema_arrow,
+        'rows': meta.num_rows,
+        'row_groups': row_groups,
+        'columns': [column_summary(meta, j) for j in range(meta.num_columns)],
+        'created_by': meta.created_by,
+        'head': head,
+    }
+
+
+# ==== 字节数格式化 ====
+def format_size(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.1f} {unit}" if unit != 'B' else f"{n} B"
+        n /= 1024
+
+
+# ==== 打印单个文件的检查结果 ====
+def print_report(report):
+    print(f"File: {report['file']}")
+    print(f"行数：{report['rows']}，行组数：{len(report['row_groups'])}，写入工具：{report['created_by']}")
+    print("Schema:")
+    print(report['schema'])
+    print("行组布局：")
+    for i, rg in enumerate(report['row_groups']):
+        print(f"  #{i}: {rg['rows']} 行，压缩后 {format_size(rg['compressed'])}，"
+              f"未压缩 {format_size(rg['uncompressed'])}")
+    print("列统计信息（来自 footer）：")
+    print(pd.DataFrame([
+        {**c, 'compressed': format_size(c['compressed']), 'uncompressed': format_size(c['uncompressed'])}
+        for c in report['columns']
+    ]).to_string(index=False, max_colwidth=40))
+    if report['head'] is not None:
+        print(f"First {head_rows} rows of the first row group:")
+        print(report['head'])
     print("\n")
+
+
+# ==== 全部文件的汇总：总行数、总大小、各列全局 min/max/null ====
+def print_summary(reports):
+    total_rows = sum(r['rows'] for r in reports)
+    compressed = sum(c['compressed'] for r in reports for c in r['columns'])
+    uncompressed = sum(c['uncompressed'] for r in reports for c in r['columns'])
+    print(f"共 {len(reports)} 个文件，{total_rows} 行，压缩后 {format_size(compressed)}，未压缩 {format_size(uncompressed)}")
+
+    merged = {}
+    for report in reports:
+        for c in report['columns']:
+            m = merged.setdefault(c['column'], {'column': c['column'], 'min': c['min'], 'max': c['max'],
+                                                'nulls': 0, 'complete': True})
+            if c['min'] is None or m['min'] is None:
+                m['complete'] = False
+            else:
+                m['min'], m['max'] = min(m['min'], c['min']), max(m['max'], c['max'])
+            if c['nulls'] is None or m['nulls'] is None:
+                m['nulls'] = None
+            else:
+                m['nulls'] += c['nulls']
+    rows = []
+    for m in merged.values():
+        rows.append({'column': m['column'],
+                     'min': m['min'] if m['complete'] else None,
+                     'max': m['max'] if m['complete'] else None,
+                     'nulls': m['nulls']})
+    print(pd.DataFrame(rows).to_string(index=False, max_colwidth=40))
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+
+    # 获取所有 .parquet 文件
+    parquet_files = sorted(f for f in os.listdir(folder_path) if f.endswith('.parquet'))
+    file_paths = [os.path.join(folder_path, f) for f in parquet_files]
+
+    if mode == 'footer':
+        # 并行读取各文件的 footer，按文件名顺序输出
+        with ThreadPoolExecutor(max_workers=max(1, min(num_workers, len(file_paths)))) as executor:
+            reports = list(executor.map(inspect_file, file_paths))
+        for report in reports:
+            print_report(report)
+        if reports:
+            print_summary(reports)
+    else:
+        # 解析并读取每个 .parquet 文件
+        for file, file_path in zip(parquet_files, file_paths):
+            # 读取 Parquet 文件
+            df = pd.read_parquet(file_path)
+
+            # 打印 DataFrame 的基本信息
+            print(f"File: {file}")
+            print("DataFrame Info:")
+            print(df.info())
+
+            # 打印 DataFrame 的前几行数据
+            print("First 5 rows of the DataFrame:")
+            print(df.head())
+            print("\n")
+
+    print(f"总耗时{time.time() - start_time:.2f} 秒")
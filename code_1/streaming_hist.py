@@ -0,0 +1,87 @@
+import numpy as np
+
+
+# ========= 可合并的固定分箱直方图与蓄水池采样 =========
+# 内存只与分箱数、采样容量有关，与数据量无关；多个文件/进程的结果可以直接合并
+
+
+# ========= 直方图：{'edges': 分箱边界, 'counts': 各箱计数} =========
+def new_histogram(low, high, bins=1000):
+    if not np.isfinite(low) or not np.isfinite(high):
+        low, high = 0.0, 1.0
+    if high <= low:
+        high = low + 1.0
+    return {'edges': np.linspace(low, high, bins + 1), 'counts': np.zeros(bins, dtype=np.int64)}
+
+
+def update_histogram(hist, values):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    # 落在范围外的值归入首尾两个箱，保证总数不丢失
+    values = np.clip(values, hist['edges'][0], hist['edges'][-1])
+    counts, _ = np.histogram(values, bins=hist['edges'])
+    hist['counts'] += counts
+    return hist
+
+
+def merge_histograms(a, b):
+    if not np.array_equal(a['edges'], b['edges']):
+        raise ValueError("直方图分箱不一致，无法合并")
+    return {'edges': a['edges'], 'counts': a['counts'] + b['counts']}
+
+
+def histogram_centers(hist):
+    edges = hist['edges']
+    return (edges[:-1] + edges[1:]) / 2
+
+
+# ========= 蓄水池采样：{'size': 容量, 'seen': 已见数量, 'sample': 样本} =========
+def new_reservoir(size, seed=42):
+    return {'size': size, 'seen': 0, 'sample': np.empty(0, dtype=np.float64),
+            'rng': np.random.default_rng(seed)}
+
+
+def update_reservoir(res, values):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    size, seen, sample = res['size'], res['seen'], res['sample']
+    if size <= 0 or len(values) == 0:
+        res['seen'] = seen + len(values)
+        return res
+
+    # 先填满蓄水池
+    fill = min(size - len(sample), len(values))
+    if fill > 0:
+        sample = np.concatenate([sample, values[:fill]])
+    rest = values[fill:]
+    if len(rest):
+        # Algorithm R 的向量化版本：第 i 个元素以 size / (i + 1) 的概率替换随机位置
+        positions = seen + fill + np.arange(len(rest))
+        j = res['rng'].integers(0, positions + 1)
+        keep = j < size
+        sample[j[keep]] = rest[keep]
+
+    res['seen'] = seen + len(values)
+    res['sample'] = sample
+    return res
+
+
+def merge_reservoirs(a, b):
+    size = max(a['size'], b['size'])
+    seen = a['seen'] + b['seen']
+    rng = a['rng']
+    merged = new_reservoir(size)
+    merged['rng'] = rng
+    merged['seen'] = seen
+    if seen == 0 or size <= 0:
+        return merged
+    # 按已见数量的比例从两个样本中抽取，保持整体均匀
+    k = min(size, len(a['sample']) + len(b['sample']))
+    take_a = rng.hypergeometric(a['seen'], b['seen'], k) if a['seen'] and b['seen'] else (k if a['seen'] else 0)
+    take_a = min(take_a, len(a['sample']))
+    take_b = min(k - take_a, len(b['sample']))
+    merged['sample'] = np.concatenate([
+        rng.choice(a['sample'], take_a, replace=False),
+        rng.choice(b['sample'], take_b, replace=False),
+    ])
+    return merged
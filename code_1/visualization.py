@@ -1,128 +1,208 @@
 import os
 import pandas as pd
+import numpy as np
 import time
 import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
-from collections import Counter, defaultdict
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from tqdm import tqdm
-
-# ========= 路径设置 =========
-csv_folder = '../data/processed_10G_data'
-save_folder = '../data/figs_10G_data'
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.processed_io import list_processed_files, read_processed, column_min_max
+from common.figures import render_figures
+from common.dataset import dataset_size, processed_folder, figs_folder, worker_count
+from streaming_hist import (new_histogram, update_histogram, merge_histograms, histogram_centers,
+                            new_reservoir, update_reservoir, merge_reservoirs)
+
+# ========= 路径设置（数据集规模可由环境变量 DATASET 指定） =========
+dataset = dataset_size('10G')
+csv_folder = processed_folder(dataset)
+save_folder = figs_folder(dataset)
 os.makedirs(save_folder, exist_ok=True)
 
-csv_files = [f for f in os.listdir(csv_folder) if f.endswith('_processed.csv')]
-
-# ========= 初始化统计器 =========
-gender_counter = Counter()
-country_counter = Counter()
-reg_date_counter = defaultdict(int)
-sampled_age = []
-sampled_income = []
-
-# ========= 扫描所有 CSV 文件 =========
-total_start = time.time()
-step1_start = total_start
-print("正在逐文件收集统计信息...")
-
-for file in tqdm(csv_files, desc="读取文件"):
-    file_path = os.path.join(csv_folder, file)
+csv_files = list_processed_files(csv_folder)
+
+# ========= 数值分布统计配置 =========
+# 直方图细分箱数（绘图时再合并为 30 个箱）；reservoir_size > 0 时额外保留均匀样本，KDE 由样本计算
+hist_bins = 1000
+reservoir_size = 0
+numeric_columns = ['age', 'income']
+
+# ========= 并行配置 =========
+# 每个进程处理一个文件并返回可合并的局部统计，num_workers = 1 时在主进程中逐文件处理
+num_workers = worker_count()
+
+# ========= 函数：统计单个文件（向量化），返回可合并的局部统计 =========
+def collect_file_stats(file_path, value_range, seed):
+    chunk = read_processed(file_path, columns=[
+        'gender', 'country', 'age', 'income', 'registration_date'
+    ])
+
+    # 分类统计
+    stats = {
+        'gender': chunk['gender'].value_counts().to_dict(),
+        'country': chunk['country'].value_counts().to_dict(),
+    }
+
+    # 数值分布：固定分箱计数 + 可选蓄水池采样
+    stats['hist'] = {}
+    stats['reservoir'] = {}
+    for col in numeric_columns:
+        values = chunk[col].dropna().to_numpy()
+        stats['hist'][col] = update_histogram(new_histogram(*value_range[col], bins=hist_bins), values)
+        stats['reservoir'][col] = update_reservoir(new_reservoir(reservoir_size, seed=seed), values)
+
+    # 时间统计（按天计数）
+    dates = pd.to_datetime(chunk['registration_date'], errors='coerce').dt.normalize()
+    stats['reg_date'] = dates.value_counts()
+    return stats
+
+
+def _collect_task(args):
+    file, file_path, value_range, seed = args
     try:
-        chunk = pd.read_csv(file_path, usecols=[
-            'gender', 'country', 'age', 'income', 'registration_date'
-        ])
-
-        # 分类统计
-        gender_counter.update(chunk['gender'].dropna())
-        country_counter.update(chunk['country'].dropna())
-
-        # 数值采样
-        sampled_age.extend(chunk['age'].dropna().tolist())
-        sampled_income.extend(chunk['income'].dropna().tolist())
-
-        # 时间统计
-        dates = pd.to_datetime(chunk['registration_date'], errors='coerce').dt.date
-        for date in dates.dropna():
-            reg_date_counter[date] += 1
+        return file, collect_file_stats(file_path, value_range, seed), None
+    except Exception as e:
+        return file, None, e
 
-        del chunk
 
-    except Exception as e:
-        print(f"跳过文件 {file}，错误：{e}")
-        continue
-step1_time = time.time() - step1_start
-print(f"已完成信息统计，用时：{step1_time:.2f} 秒")
+# ========= 绘图风格与中文字体（每个渲染进程中设置） =========
+def setup_style():
+    sns.set_theme(style="whitegrid")
+    matplotlib.rc("font", family='SimHei')
 
-# ========= 设置绘图风格与中文字体 =========
-print("开始绘制图像")
-step2_start = time.time()
-sns.set_theme(style="whitegrid")
-matplotlib.rc("font", family='SimHei')
 
 # ========= 1. Gender 饼图 =========
-plt.figure(figsize=(6, 6))
-labels, sizes = zip(*gender_counter.items())
-plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
-plt.title("性别分布饼状图")
-plt.axis('equal')
-plt.tight_layout()
-plt.savefig(os.path.join(save_folder, "gender_distribution.png"))
-print("性别分布饼状图已绘制完成")
-# plt.show()
+def render_gender_pie(gender_counts, output_path):
+    plt.figure(figsize=(6, 6))
+    labels, sizes = zip(*gender_counts.items())
+    plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
+    plt.title("性别分布饼状图")
+    plt.axis('equal')
+    plt.tight_layout()
+    plt.savefig(output_path)
+
 
 # ========= 2. Country 饼图 =========
-plt.figure(figsize=(6, 6))
-top_items = country_counter.most_common(5)
-top_labels = [k for k, _ in top_items]
-top_sizes = [v for _, v in top_items]
-other_total = sum(country_counter.values()) - sum(top_sizes)
-labels = top_labels + ['其他']
-sizes = top_sizes + [other_total]
-plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
-plt.title("国家分布饼状图 (Top 5 + 其他)")
-plt.axis('equal')
-plt.tight_layout()
-plt.savefig(os.path.join(save_folder, "country_distribution.png"))
-print("国家分布饼状图已绘制完成")
-# plt.show()
-
-# ========= 3. age 直方图 =========
-plt.figure(figsize=(6, 4))
-sns.histplot(sampled_age, kde=True, bins=30)
-plt.title("年龄分布直方图")
-plt.xlabel("年龄")
-plt.ylabel("用户数量")
-plt.tight_layout()
-plt.savefig(os.path.join(save_folder, "age_distribution.png"))
-print("年龄分布直方图已绘制完成")
-# plt.show()
-
-# ========= 4. income 直方图 =========
-plt.figure(figsize=(6, 4))
-sns.histplot(sampled_income, kde=True, bins=30)
-plt.title("收入分布直方图")
-plt.xlabel("收入")
-plt.ylabel("用户数量")
-plt.tight_layout()
-plt.savefig(os.path.join(save_folder, "income_distribution.png"))
-print("收入分布直方图已绘制完成")
-# plt.show()
+def render_country_pie(country_counts, output_path):
+    plt.figure(figsize=(6, 6))
+    top_items = Counter(country_counts).most_common(5)
+    top_labels = [k for k, _ in top_items]
+    top_sizes = [v for _, v in top_items]
+    other_total = sum(country_counts.values()) - sum(top_sizes)
+    labels = top_labels + ['其他']
+    sizes = top_sizes + [other_total]
+    plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
+    plt.title("国家分布饼状图 (Top 5 + 其他)")
+    plt.axis('equal')
+    plt.tight_layout()
+    plt.savefig(output_path)
+
+
+# ========= 3 / 4. 数值分布直方图 =========
+# 柱形与 KDE 均由分箱计数（以箱中心加权）计算；开启蓄水池采样时改用样本并按总数缩放
+def render_numeric_histogram(data, output_path):
+    hist, res = data['hist'], data['reservoir']
+    plt.figure(figsize=(6, 4))
+    if len(res['sample']):
+        x = res['sample']
+        weights = np.full(len(x), res['seen'] / len(x))
+    else:
+        x = histogram_centers(hist)
+        weights = hist['counts']
+    sns.histplot(x=x, weights=weights, kde=True, bins=30, binrange=(hist['edges'][0], hist['edges'][-1]))
+    plt.title(data['title'])
+    plt.xlabel(data['xlabel'])
+    plt.ylabel("用户数量")
+    plt.tight_layout()
+    plt.savefig(output_path)
+
 
 # ========= 5. reg_date折线图 =========
-plt.figure(figsize=(10, 5))
-reg_series = pd.Series(reg_date_counter).sort_index()
-reg_series.plot(kind='line')
-plt.title("用户注册日期折线图")
-plt.xlabel("日期")
-plt.ylabel("注册数量")
-plt.grid(True)
-plt.tight_layout()
-plt.savefig(os.path.join(save_folder, "registration_trend.png"))
-print("用户注册日期折线图已绘制完成")
-step2_time = time.time() - step2_start
-print(f"已完成绘图，用时{step2_time:.2f} 秒")
-total_time = time.time() - total_start
-print(f"总耗时{total_time:.2f} 秒")
-# plt.show()
\ No newline at end of file
+def render_registration_trend(reg_series, output_path):
+    plt.figure(figsize=(10, 5))
+    reg_series.sort_index().plot(kind='line')
+    plt.title("用户注册日期折线图")
+    plt.xlabel("日期")
+    plt.ylabel("注册数量")
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(output_path)
+
+
+if __name__ == '__main__':
+    # ========= 扫描所有 CSV 文件 =========
+    total_start = time.time()
+    step1_start = total_start
+
+    # 先确定数值列的全局范围（parquet 只读取 footer 统计信息）
+    print("正在确定数值列范围...")
+    value_range = {col: [np.inf, -np.inf] for col in numeric_columns}
+    for file in csv_files:
+        file_path = os.path.join(csv_folder, file)
+        for col in numeric_columns:
+            try:
+                low, high = column_min_max(file_path, col)
+            except Exception as e:
+                print(f"无法读取 {file} 中 {col} 的范围，错误：{e}")
+                continue
+            if np.isfinite(low) and np.isfinite(high):
+                value_range[col][0] = min(value_range[col][0], low)
+                value_range[col][1] = max(value_range[col][1], high)
+
+    # ========= 初始化统计器 =========
+    gender_counter = Counter()
+    country_counter = Counter()
+    reg_date_parts = []
+    histograms = {col: new_histogram(*value_range[col], bins=hist_bins) for col in numeric_columns}
+    reservoirs = {col: new_reservoir(reservoir_size) for col in numeric_columns}
+
+    print("正在逐文件收集统计信息...")
+    tasks = [(file, os.path.join(csv_folder, file), value_range, seed) for seed, file in enumerate(csv_files)]
+    workers = max(1, min(num_workers, len(tasks)))
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_collect_task, tasks)
+    else:
+        executor = None
+        results = map(_collect_task, tasks)
+
+    # 按文件顺序在主进程中合并局部统计
+    for file, stats, error in tqdm(results, total=len(tasks), desc="读取文件"):
+        if error is not None:
+            print(f"跳过文件 {file}，错误：{error}")
+            continue
+        gender_counter.update(stats['gender'])
+        country_counter.update(stats['country'])
+        for col in numeric_columns:
+            histograms[col] = merge_histograms(histograms[col], stats['hist'][col])
+            reservoirs[col] = merge_reservoirs(reservoirs[col], stats['reservoir'][col])
+        reg_date_parts.append(stats['reg_date'])
+    if executor is not None:
+        executor.shutdown()
+
+    reg_date_counter = pd.concat(reg_date_parts).groupby(level=0).sum() if reg_date_parts else pd.Series(dtype='int64')
+    step1_time = time.time() - step1_start
+    print(f"已完成信息统计，用时：{step1_time:.2f} 秒")
+
+    # ========= 并行渲染图像（输入未变化的图像直接跳过） =========
+    print("开始绘制图像")
+    step2_start = time.time()
+    figure_jobs = [
+        (os.path.join(save_folder, "gender_distribution.png"), render_gender_pie, dict(gender_counter)),
+        (os.path.join(save_folder, "country_distribution.png"), render_country_pie, dict(country_counter)),
+        (os.path.join(save_folder, "age_distribution.png"), render_numeric_histogram,
+         {'hist': histograms['age'], 'reservoir': reservoirs['age'], 'title': "年龄分布直方图", 'xlabel': "年龄"}),
+        (os.path.join(save_folder, "income_distribution.png"), render_numeric_histogram,
+         {'hist': histograms['income'], 'reservoir': reservoirs['income'], 'title': "收入分布直方图", 'xlabel': "收入"}),
+        (os.path.join(save_folder, "registration_trend.png"), render_registration_trend, reg_date_counter),
+    ]
+    render_figures(figure_jobs, setup=setup_style, workers=num_workers)
+    step2_time = time.time() - step2_start
+    print(f"已完成绘图，用时{step2_time:.2f} 秒")
+    total_time = time.time() - total_start
+    print(f"总耗时{total_time:.2f} 秒")
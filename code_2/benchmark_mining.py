@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from mlxtend.preprocessing import TransactionEncoder
+from mlxtend.frequent_patterns import apriori
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.transactions_io import load_transactions, category_order
+from common.dataset import dataset_size, processed_folder
+from rule_mining import ENGINES, category_baskets, collapse_baskets, payment_baskets, find_itemsets
+
+# ==== 频繁项集挖掘引擎的时间 / 内存对比 ====
+# dense 为改造前的做法（TransactionEncoder 稠密布尔矩阵 + apriori），其余见 rule_mining.find_itemsets。
+# 峰值内存由 tracemalloc 统计（包含 numpy / pandas 的数组分配），只计挖掘阶段，不含数据加载。
+# input_rows 为引擎实际处理的行数：bitset 只处理不同事务；apriori / fpgrowth / fpmax 需要把去重事务
+# 按次数展开为每条购买记录一行（mlxtend 不支持行权重），内存与 dense 一样随购买记录数增长，并不更省内存
+data_folder = processed_folder(dataset_size('10G'))
+output_path = os.path.join(data_folder, 'mining_benchmark.csv')
+engines = ['dense'] + list(ENGINES)
+min_supports = [0.02, 0.005, 0.001]
+skip_dense_above = 5_000_000  # 事务数超过该值时跳过 dense（内存不可控）
+
+
+# ==== 运行一次挖掘，返回 (频繁项集数, 耗时秒, 峰值内存 MB) ====
+def run_engine(engine, baskets, counts, items, min_support):
+    if engine == 'dense':
+        expanded = np.repeat(baskets, counts)
+        transactions = [[items[i] for i in range(len(items)) if (int(m) >> i) & 1] for m in expanded]
+    tracemalloc.start()
+    start = time.perf_counter()
+    if engine == 'dense':
+        te = TransactionEncoder()
+        onehot = pd.DataFrame(te.fit(transactions).transform(transactions), columns=te.columns_)
+        itemsets = apriori(onehot, min_support=min_support, use_colnames=True)
+    else:
+        itemsets = find_itemsets(baskets, counts, items, min_support, engine=engine)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(itemsets), elapsed, peak / 1024 ** 2
+
+
+if __name__ == '__main__':
+    print("正在加载 structured_transactions")
+    df = load_transactions(data_folder)
+    masks, categories = category_baskets(df, category_order(data_folder))
+    refund = df["payment_status"].isin(["已退款", "部分退款"]).to_numpy()
+
+    workloads = {
+        'category': collapse_baskets(masks) + (categories,),
+        'refund': collapse_baskets(masks[refund]) + (categories,),
+        'payment': payment_baskets(df["payment_method"], masks, categories),
+    }
+
+    rows = []
+    for name, (baskets, counts, items) in workloads.items():
+        n_transactions = int(counts.sum())
+        print(f"\n== {name}：{n_transactions} 条事务，{len(baskets)} 种不同事务，{len(items)} 个项 ==")
+        for min_support in min_supports:
+            for engine in engines:
+                if engine == 'dense' and n_transactions > skip_dense_above:
+                    print(f"  {engine:<9} min_support={min_support:<6} 跳过（事务数过多）")
+                    continue
+                n_itemsets, elapsed, peak_mb = run_engine(engine, baskets, counts, items, min_support)
+                print(f"  {engine:<9} min_support={min_support:<6} 项集 {n_itemsets:>5}  "
+                      f"耗时 {elapsed:8.3f} 秒  峰值内存 {peak_mb:9.2f} MB")
+                rows.append({
+                    'workload': name, 'transactions': n_transactions, 'distinct_baskets': len(baskets),
+                    'engine': engine, 'input_rows': len(baskets) if engine == 'bitset' else n_transactions, 'min_support': min_support, 'itemsets': n_itemsets,
+                    'seconds': round(elapsed, 4), 'peak_mb': round(peak_mb, 2),
+                })
+
+    pd.DataFrame(rows).to_csv(output_path, index=False)
+    print(f"\n对比结果已保存至：{output_path}")
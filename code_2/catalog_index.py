@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.fingerprint import file_sha256
+
+# ==== 商品目录索引：商品 ID -> 大类编号 ====
+# 商品 ID 为非负整数时编译为稠密数组，lookup[id] 即大类编号（-1 表示未知商品或无大类）；
+# 否则退化为按 ID 建立的 pandas 索引。编译结果缓存为 .npz，目录文件内容或小类映射变化时重新编译
+INDEX_VERSION = 1
+
+
+def _mapping_hash(subcategory_to_category):
+    text = json.dumps(subcategory_to_category, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# ==== 大类列表：按映射中首次出现的顺序编号 ====
+def category_names(subcategory_to_category):
+    return list(dict.fromkeys(subcategory_to_category.values()))
+
+
+# ==== 编译商品目录 ====
+def compile_catalog(catalog_path, subcategory_to_category):
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        catalog = json.load(f)
+    categories = category_names(subcategory_to_category)
+    code_of = {cat: i for i, cat in enumerate(categories)}
+
+    product_ids = [item['id'] for item in catalog['products']]
+    codes = np.array([
+        code_of.get(subcategory_to_category.get(item.get('category')), -1) for item in catalog['products']
+    ], dtype=np.int16)
+
+    ids = pd.Series(product_ids)
+    # ID 过于稀疏时稠密数组会浪费内存，改用哈希索引
+    if len(ids) and pd.api.types.is_integer_dtype(ids) and ids.min() >= 0 and ids.max() < 16 * len(ids) + 1_000_000:
+        lookup = np.full(int(ids.max()) + 1, -1, dtype=np.int16)
+        # 与 dict 构造一致：重复 ID 以最后一次出现为准
+        lookup[ids.to_numpy()] = codes
+        return {'categories': categories, 'lookup': lookup, 'keys': None}
+    last = ~ids.duplicated(keep='last').to_numpy()
+    return {'categories': categories, 'lookup': codes[last], 'keys': ids[last].to_numpy(dtype=object)}
+
+
+# ==== 读取缓存的索引，缓存缺失或过期时重新编译 ====
+def load_catalog_index(catalog_path, subcategory_to_category, cache_path=None):
+    if cache_path is None:
+        cache_path = os.path.splitext(catalog_path)[0] + '.index.npz'
+    signature = f"{INDEX_VERSION}|{file_sha256(catalog_path)}|{_mapping_hash(subcategory_to_category)}"
+
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=True) as cached:
+                if str(cached['signature']) == signature:
+                    keys = cached['keys']
+                    return {
+                        'categories': cached['categories'].tolist(),
+                        'lookup': cached['lookup'],
+                        'keys': None if keys.shape == () else keys,
+                    }
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index = compile_catalog(catalog_path, subcategory_to_category)
+    np.savez(cache_path, signature=np.array(signature),
+             categories=np.array(index['categories'], dtype=object),
+             lookup=index['lookup'],
+             keys=np.array(None) if index['keys'] is None else index['keys'])
+    return index
+
+
+# ==== 将商品 ID 映射为大类编号（-1 表示未知） ====
+def lookup_categories(index, item_ids):
+    lookup = index['lookup']
+    if index['keys'] is None:
+        values = pd.Series(item_ids)
+        # 与 dict 查找一致：字符串形式的 ID（如 "5"）不匹配数值 ID，视为未知；
+        # 先用 infer_dtype 判断，只有确实含字符串时才逐个检查
+        if pd.api.types.infer_dtype(values, skipna=True) not in ('integer', 'floating', 'mixed-integer-float',
+                                                                  'boolean', 'empty'):
+            is_str = np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(values))
+            values = values.astype(object).where(~is_str, None)
+        ids = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+        valid = ~np.isnan(ids) & (ids >= 0) & (ids < len(lookup)) & (ids == np.floor(ids))
+        codes = np.full(len(ids), -1, dtype=np.int16)
+        codes[valid] = lookup[ids[valid].astype(np.int64)]
+        return codes
+    pos = pd.Index(index['keys']).get_indexer(item_ids)
+    return np.where(pos >= 0, lookup[pos], -1).astype(np.int16)
+
+
+# ==== 按购买记录聚合大类，返回每条记录的类别位掩码 ====
+# row_positions 为每个商品所属记录的位置（0..n_rows-1）
+def category_masks(index, row_positions, item_ids, n_rows):
+    codes = lookup_categories(index, item_ids)
+    valid = codes >= 0
+    masks = np.zeros(n_rows, dtype=np.int64)
+    np.bitwise_or.at(masks, np.asarray(row_positions)[valid], np.left_shift(1, codes[valid].astype(np.int64)))
+    return masks
+
+
+# ==== 将位掩码还原为类别列表（每种掩码只计算一次） ====
+def masks_to_lists(masks, categories):
+    masks = pd.Series(masks)
+    table = {
+        m: [cat for i, cat in enumerate(categories) if (m >> i) & 1]
+        for m in masks.unique()
+    }
+    # 空输入时 map 的结果为 float64，统一为 object 以便按 list<string> 写出
+    return masks.map(table).astype(object)
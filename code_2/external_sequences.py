@@ -0,0 +1,82 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from tqdm import tqdm
+
+from transitions import flatten_sequences, count_transitions, merge_transitions
+
+
+# ========= 用户购买序列的外部排序（按 user_id 哈希分区溢写，内存有界） =========
+# 第一遍：逐批读取 structured_transactions 分片的 user_id / purchase_date / category_mask，
+#         按 hash(user_id) 分区写入溢写文件（同一用户的全部记录落在同一分区）
+# 第二遍：逐分区排序、构建类别序列并统计转移，各分区的转移计数直接相加
+# 分区内按 (文件, 批次) 顺序拼接，保持原始行序，结果与整体排序完全一致
+SPILL_COLUMNS = ['user_id', 'purchase_date', 'category_mask']
+
+
+def _partition_of(ids, num_partitions):
+    return (pd.util.hash_array(ids) % num_partitions).astype(np.int64)
+
+
+# ========= 函数：第一遍，按用户分区溢写 =========
+# on_batch(purchase_date, masks) 在每个批次上调用一次，可顺带做其他可累加的统计
+def spill_transactions(file_paths, work_dir, num_partitions, batch_size=1_000_000, on_batch=None):
+    chunk_idx = 0
+    for file_path in tqdm(file_paths, desc="交易记录分区溢写"):
+        for batch in pq.ParquetFile(file_path).iter_batches(columns=SPILL_COLUMNS, batch_size=batch_size):
+            users = batch.column('user_id').to_numpy(zero_copy_only=False)
+            dates = pd.Series(batch.column('purchase_date').to_pandas()).to_numpy(dtype='datetime64[ns]')
+            masks = batch.column('category_mask').to_numpy(zero_copy_only=False).astype(np.int64)
+            if on_batch is not None:
+                on_batch(pd.Series(dates), masks)
+
+            part = _partition_of(users, num_partitions)
+            order = np.argsort(part, kind='stable')
+            bounds = np.searchsorted(part[order], np.arange(num_partitions + 1))
+            for p in range(num_partitions):
+                sel = order[bounds[p]:bounds[p + 1]]
+                if not len(sel):
+                    continue
+                part_dir = os.path.join(work_dir, f"part_{p:04d}")
+                os.makedirs(part_dir, exist_ok=True)
+                np.savez(os.path.join(part_dir, f"{chunk_idx:08d}.npz"),
+                         user=users[sel], date=dates[sel], mask=masks[sel])
+            chunk_idx += 1
+
+
+# ========= 函数：第二遍，逐分区统计转移并合并 =========
+def count_partitions(work_dir, num_partitions, categories, steps=(1,), period=None):
+    n = len(categories)
+    matrices = {k: np.zeros((n, n), dtype=np.int64) for k in steps}
+    by_period = {}
+    for p in tqdm(range(num_partitions), desc="分区统计转移"):
+        part_dir = os.path.join(work_dir, f"part_{p:04d}")
+        if not os.path.isdir(part_dir):
+            continue
+        users, dates, masks = [], [], []
+        for chunk in sorted(os.listdir(part_dir)):
+            with np.load(os.path.join(part_dir, chunk), allow_pickle=True) as data:
+                users.append(data['user'])
+                dates.append(data['date'])
+                masks.append(data['mask'])
+        seq_users, codes, seq_dates = flatten_sequences(
+            np.concatenate(users), np.concatenate(dates), np.concatenate(masks), categories)
+        part_matrices, part_periods = count_transitions(seq_users, codes, seq_dates, n, steps=steps, period=period)
+        merge_transitions(matrices, part_matrices)
+        merge_transitions(by_period, part_periods)
+        shutil.rmtree(part_dir)
+    return matrices, by_period
+
+
+# ========= 函数：完整的外部排序流程 =========
+def external_transitions(file_paths, categories, work_dir, num_partitions=64, batch_size=1_000_000,
+                         steps=(1,), period=None, on_batch=None):
+    if os.path.exists(work_dir):
+        shutil.rmtree(work_dir)
+    os.makedirs(work_dir)
+    spill_transactions(file_paths, work_dir, num_partitions, batch_size=batch_size, on_batch=on_batch)
+    result = count_partitions(work_dir, num_partitions, categories, steps=steps, period=period)
+    shutil.rmtree(work_dir)
+    return result
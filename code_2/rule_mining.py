@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import hashlib
+import pandas as pd
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.fingerprint import load_manifest, save_manifest
+
+
+# ==== 规则排序：按 lift、confidence、support 降序，再按前件/后件的字典序 ====
+# mlxtend 输出的规则顺序取决于 frozenset 的迭代顺序（随进程变化），
+# 统一排序后保存的 csv 与绘图输入在多次运行之间保持一致
+def sort_rules(rules):
+    if rules.empty:
+        return rules
+    keys = pd.DataFrame({
+        'lift': rules['lift'],
+        'confidence': rules['confidence'],
+        'support': rules['support'],
+        'ant': rules['antecedents'].map(lambda s: tuple(sorted(s))),
+        'con': rules['consequents'].map(lambda s: tuple(sorted(s))),
+    }, index=rules.index)
+    keys = keys.sort_values(['lift', 'confidence', 'support', 'ant', 'con'],
+                            ascending=[False, False, False, True, True], kind='mergesort')
+    return rules.loc[keys.index].reset_index(drop=True)
+
+
+# ==== 位掩码事务：每条事务编码为一个整数，第 i 位表示 items[i] 出现 ====
+# 项的总数很小（约 10 个大类 + 7 种支付方式），相同的事务合并为 (掩码, 次数)，
+# 之后所有项集的支持度都只需在去重后的掩码上精确计数
+MAX_ITEMS = 63
+
+
+# ==== 将事务列表编码为位掩码（items 缺省时与 TransactionEncoder 一样按名称排序） ====
+def encode_baskets(transactions, items=None):
+    exploded = pd.Series(list(transactions), dtype=object).explode()
+    if items is None:
+        items = sorted(exploded.dropna().unique())
+    items = list(items)
+    if len(items) > MAX_ITEMS:
+        raise ValueError(f"项的数量超过 {MAX_ITEMS}，无法编码为位掩码")
+    codes = pd.Index(items).get_indexer(exploded.to_numpy())
+    valid = codes >= 0
+    masks = np.zeros(len(transactions), dtype=np.int64)
+    np.bitwise_or.at(masks, exploded.index.to_numpy()[valid], np.left_shift(1, codes[valid].astype(np.int64)))
+    return masks, items
+
+
+# ==== 合并相同的事务，返回 (去重掩码, 次数)；weights 为每条事务的权重 ====
+def collapse_baskets(masks, weights=None):
+    masks = np.asarray(masks, dtype=np.int64)
+    if weights is None:
+        return np.unique(masks, return_counts=True)
+    unique, inverse = np.unique(masks, return_inverse=True)
+    counts = np.bincount(inverse.ravel(), weights=np.asarray(weights), minlength=len(unique))
+    return unique, counts.astype(np.int64)
+
+
+# ==== 统计候选项集在去重事务中的出现次数（分块，避免候选数 × 事务数过大） ====
+def _count_supports(candidates, masks, counts, chunk_cells=4_000_000):
+    result = np.empty(len(candidates), dtype=np.int64)
+    step = max(1, chunk_cells // max(1, len(masks)))
+    for start in range(0, len(candidates), step):
+        chunk = candidates[start:start + step, None]
+        result[start:start + step] = ((masks[None, :] & chunk) == chunk) @ counts
+    return result
+
+
+# ==== 位掩码 Apriori：输出与 mlxtend apriori(use_colnames=True) 相同的 support / itemsets 两列 ====
+# 可直接传给 association_rules；支持度按 次数 / 总事务数 精确计算
+def mine_itemsets(masks, counts, items, min_support, max_len=None):
+    masks = np.asarray(masks, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    total = counts.sum()
+    found_masks, found_support = [], []
+    if total == 0:
+        return pd.DataFrame({'support': pd.Series(dtype=float), 'itemsets': pd.Series(dtype=object)})
+
+    bits = np.left_shift(1, np.arange(len(items), dtype=np.int64))
+    level = bits
+    size = 1
+    while len(level):
+        support = _count_supports(level, masks, counts) / total
+        keep = support >= min_support
+        frequent = level[keep]
+        found_masks.append(frequent)
+        found_support.append(support[keep])
+        if size == 1:
+            bits = frequent
+        if len(frequent) == 0 or (max_len is not None and size >= max_len):
+            break
+
+        # 候选 = 频繁 k 项集 ∪ 一个不在其中的频繁单项，再剪去含非频繁 k 子集的候选
+        extend = (frequent[:, None] & bits[None, :]) == 0
+        candidates = np.unique((frequent[:, None] | bits[None, :])[extend])
+        ok = np.ones(len(candidates), dtype=bool)
+        for bit in bits:
+            has = (candidates & bit) != 0
+            ok &= ~has | np.isin(candidates & ~bit, frequent)
+        level = candidates[ok]
+        size += 1
+
+    all_masks = np.concatenate(found_masks)
+    names = [
+        frozenset(items[i] for i in range(len(items)) if (int(m) >> i) & 1)
+        for m in all_masks
+    ]
+    result = pd.DataFrame({'support': np.concatenate(found_support), 'itemsets': names})
+    # 与 mlxtend 一致：按项集长度排列，同长度内按项的顺序排列
+    order = sorted(range(len(all_masks)), key=lambda k: (
+        len(names[k]), [i for i in range(len(items)) if (int(all_masks[k]) >> i) & 1]))
+    return result.iloc[order].reset_index(drop=True)
+
+
+# ==== 每条购买记录的大类位掩码：优先直接使用 transaction.py 写出的 category_mask ====
+# categories 为 category_mask 的位序（common.transactions_io.category_order），旧版 csv 输出没有该列时逐条编码
+def category_baskets(df, categories=None):
+    if categories is not None and 'category_mask' in df.columns:
+        return df['category_mask'].to_numpy(dtype=np.int64), list(categories)
+    return encode_baskets(df['main_categories'])
+
+
+# ==== 支付方式 × 大类 计数表：每条购买记录的每个大类构成一条 [支付方式, 大类] 事务 ====
+# 按大类位逐一统计各支付方式的次数，一次遍历得到列联表，不逐条构造事务列表；
+# price 不为空时同时统计 price > high_value 的购买记录中各支付方式的次数（否则返回 None）
+def payment_category_table(payment_method, masks, categories, price=None, high_value=5000):
+    pay_codes, pay_names = pd.factorize(payment_method, sort=True)
+    pay_names = [str(p) for p in pay_names]
+    has_pay = pay_codes >= 0
+    table = np.empty((len(pay_names), len(categories)), dtype=np.int64)
+    for i in range(len(categories)):
+        has_cat = ((masks >> i) & 1).astype(bool) & has_pay
+        table[:, i] = np.bincount(pay_codes[has_cat], minlength=len(pay_names))
+    table = pd.DataFrame(table, index=pay_names, columns=list(categories))
+
+    high_value_counts = None
+    if price is not None:
+        high = (np.asarray(price, dtype=float) > high_value) & has_pay
+        high_value_counts = pd.Series(np.bincount(pay_codes[high], minlength=len(pay_names)), index=pay_names)
+    return table, high_value_counts
+
+
+# ==== [支付方式, 大类] 事务的带权位掩码，返回 (去重掩码, 次数, items) ====
+def payment_baskets(payment_method, masks, categories):
+    table, _ = payment_category_table(payment_method, masks, categories)
+    items = sorted(set(table.index) | set(table.columns))
+    pos = pd.Index(items)
+    pay_bits = np.left_shift(1, pos.get_indexer(table.index).astype(np.int64))
+    cat_bits = np.left_shift(1, pos.get_indexer(table.columns).astype(np.int64))
+    pair_masks = (pay_bits[:, None] | cat_bits[None, :]).ravel()
+    baskets, counts = collapse_baskets(pair_masks, weights=table.to_numpy().ravel())
+    return baskets, counts, items
+
+
+# ==== 由列联表闭式计算 1→1 规则 ====
+# 每条事务恰好包含一个行项和一个列项（如 [支付方式, 大类]），频繁项集最多两项，
+# 所有规则都是 行项→列项 或 列项→行项，支持度与各项指标可直接由计数得到。
+# 筛选条件与 apriori 一致（单项与两项集支持度 >= min_support），指标公式与 mlxtend association_rules 相同
+RULE_COLUMNS = ['antecedents', 'consequents', 'antecedent support', 'consequent support', 'support',
+                'confidence', 'lift', 'representativity', 'leverage', 'conviction', 'zhangs_metric',
+                'jaccard', 'certainty', 'kulczynski']
+
+
+def pair_rules(table, min_support):
+    counts = table.to_numpy(dtype=np.int64)
+    total = counts.sum()
+    if total == 0:
+        return pd.DataFrame(columns=RULE_COLUMNS)
+    row_support = counts.sum(axis=1) / total
+    col_support = counts.sum(axis=0) / total
+    pair_support = counts / total
+
+    frequent = (
+        (pair_support >= min_support) &
+        (row_support[:, None] >= min_support) &
+        (col_support[None, :] >= min_support)
+    )
+    r, c = np.nonzero(frequent)
+    row_names = np.array([frozenset([x]) for x in table.index], dtype=object)
+    col_names = np.array([frozenset([x]) for x in table.columns], dtype=object)
+
+    # 两个方向：行项→列项、列项→行项
+    antecedents = np.concatenate([row_names[r], col_names[c]])
+    consequents = np.concatenate([col_names[c], row_names[r]])
+    sA = np.concatenate([row_support[r], col_support[c]])
+    sC = np.concatenate([col_support[c], row_support[r]])
+    sAC = np.concatenate([pair_support[r, c], pair_support[r, c]])
+
+    confidence = sAC / sA
+    leverage = sAC - sA * sC
+    conviction = np.full(len(sAC), np.inf)
+    below = confidence < 1.0
+    conviction[below] = (1.0 - sC[below]) / (1.0 - confidence[below])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denominator = np.maximum(sAC * (1 - sA), sA * (sC - sAC))
+        zhangs_metric = np.where(denominator == 0, 0, leverage / denominator)
+        certainty = np.where(1 - sC == 0, 0, (confidence - sC) / (1 - sC))
+
+    return pd.DataFrame({
+        'antecedents': antecedents,
+        'consequents': consequents,
+        'antecedent support': sA,
+        'consequent support': sC,
+        'support': sAC,
+        'confidence': confidence,
+        'lift': confidence / sC,
+        'representativity': np.ones(len(sAC)),
+        'leverage': leverage,
+        'conviction': conviction,
+        'zhangs_metric': zhangs_metric,
+        'jaccard': sAC / (sA + sC - sAC),
+        'certainty': certainty,
+        'kulczynski': (sAC / sA + sAC / sC) / 2,
+    }, columns=RULE_COLUMNS)
+
+
+# ==== 位掩码事务 → 稀疏 one-hot 表（每条事务一行，列为 items），供 mlxtend 使用 ====
+# counts 不为空时 masks 为去重后的事务，按次数展开为原始行数：mlxtend 不支持带权重的行，
+# 展开后表的行数（以及内存）仍与购买记录数成正比，稀疏只节省了每行的列，不能替代去重计数
+def baskets_to_sparse(masks, items, counts=None):
+    from scipy import sparse
+
+    masks = np.asarray(masks, dtype=np.int64)
+    if counts is not None:
+        masks = np.repeat(masks, np.asarray(counts, dtype=np.int64))
+    rows, cols = [], []
+    for i in range(len(items)):
+        hit = np.flatnonzero((masks >> i) & 1)
+        rows.append(hit)
+        cols.append(np.full(len(hit), i, dtype=np.int64))
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(len(masks), len(items)))
+    return pd.DataFrame.sparse.from_spmatrix(matrix, columns=list(items))
+
+
+# ==== 频繁项集挖掘的统一入口 ====
+# engine 可选：
+#   bitset   —— 在去重位掩码上精确计数（默认，内存只与不同事务的数量有关）
+#   apriori / fpgrowth —— mlxtend 实现，输入为按次数展开的稀疏 one-hot 表（每条购买记录一行），
+#                         内存随购买记录数增长，与 dense 同一量级，只用于对照
+#   fpmax    —— 仅输出极大频繁项集，缺少子集的支持度，不能直接传给 association_rules
+ENGINES = ('bitset', 'apriori', 'fpgrowth', 'fpmax')
+
+
+def find_itemsets(baskets, counts, items, min_support, engine='bitset', max_len=None):
+    if engine == 'bitset':
+        return mine_itemsets(baskets, counts, items, min_support, max_len=max_len)
+    if engine not in ENGINES:
+        raise ValueError(f"未知的挖掘引擎：{engine}，可选 {', '.join(ENGINES)}")
+    from mlxtend.frequent_patterns import apriori, fpgrowth, fpmax
+
+    miner = {'apriori': apriori, 'fpgrowth': fpgrowth, 'fpmax': fpmax}[engine]
+    onehot = baskets_to_sparse(baskets, items, counts)
+    return miner(onehot, min_support=min_support, use_colnames=True, max_len=max_len)
+
+
+# ==== 频繁项集缓存 ====
+# 以去重事务的内容哈希（数据指纹）+ min_support + 引擎为键，保存在 cache_folder/<name>.json 中；
+# 数据变化后指纹随之变化，旧记录被丢弃
+ITEMSET_CACHE_VERSION = 1
+
+
+def basket_fingerprint(baskets, counts, items):
+    h = hashlib.sha256()
+    h.update(np.ascontiguousarray(baskets, dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(counts, dtype=np.int64).tobytes())
+    h.update(json.dumps(list(items), ensure_ascii=False).encode('utf-8'))
+    return h.hexdigest()
+
+
+def load_or_find_itemsets(baskets, counts, items, min_support, cache_folder, name, engine='bitset', max_len=None):
+    os.makedirs(cache_folder, exist_ok=True)
+    cache_path = os.path.join(cache_folder, f"{name}.json")
+    fingerprint = basket_fingerprint(baskets, counts, items)
+    cache = load_manifest(cache_path)
+    if cache.get('version') != ITEMSET_CACHE_VERSION or cache.get('fingerprint') != fingerprint:
+        cache = {'version': ITEMSET_CACHE_VERSION, 'fingerprint': fingerprint, 'entries': {}}
+
+    key = f"{min_support!r}|{engine}|{max_len}"
+    entry = cache['entries'].get(key)
+    if entry is not None:
+        print(f"频繁项集缓存命中：{name}（min_support={min_support}）")
+        return pd.DataFrame({'support': pd.Series(entry['support'], dtype=float),
+                             'itemsets': pd.Series([frozenset(s) for s in entry['itemsets']], dtype=object)})
+
+    itemsets = find_itemsets(baskets, counts, items, min_support, engine=engine, max_len=max_len)
+    cache['entries'][key] = {
+        'support': itemsets['support'].tolist(),
+        'itemsets': [sorted(s) for s in itemsets['itemsets']],
+    }
+    save_manifest(cache_path, cache)
+    return itemsets
+
+
+# ==== 一次计算全部候选规则的指标（不设阈值），之后的阈值筛选只是向量化过滤 ====
+def all_rules(frequent_itemsets):
+    from mlxtend.frequent_patterns import association_rules
+
+    if frequent_itemsets.empty:
+        return pd.DataFrame(columns=['antecedents', 'consequents', 'support', 'confidence', 'lift'])
+    return association_rules(frequent_itemsets, metric="confidence", min_threshold=0)
+
+
+# ==== 按阈值阶梯选取规则 ====
+# ladder 为 [(指标, 阈值), ...]，返回第一个非空档位的规则及其档位下标（都为空时下标为 -1）；
+# 阈值判断与 association_rules 一致（指标 >= 阈值），所有档位在一次向量化比较中完成。
+# target_count 不为空时改为按 metric 取前 target_count 条规则（与第 target_count 条并列的一并保留），必须 >= 1
+def select_rules(rules, ladder=None, target_count=None, metric='lift'):
+    if target_count is not None:
+        if target_count < 1:
+            raise ValueError(f"target_count 必须为正整数，当前为 {target_count}")
+        if rules.empty:
+            return rules, -1
+        values = rules[metric].to_numpy()
+        threshold = np.sort(values)[::-1][min(target_count, len(values)) - 1]
+        return rules[values >= threshold].copy(), 0
+
+    metrics = [m for m, _ in ladder]
+    thresholds = np.array([t for _, t in ladder], dtype=float)
+    passed = rules[metrics].to_numpy(dtype=float) >= thresholds[None, :]
+    non_empty = np.flatnonzero(passed.any(axis=0))
+    step = int(non_empty[0]) if len(non_empty) else -1
+    for m, t in ladder[1:(step if step >= 0 else len(ladder) - 1) + 1]:
+        print(f"没有满足规则的结果，尝试使用 {m} > {t}")
+    if step < 0:
+        return rules.iloc[:0], step
+    return rules[passed[:, step]].copy(), step
@@ -1,76 +1,92 @@
-import pandas as pd
-import ast
+import os
+import sys
 import time
 import matplotlib.pyplot as plt
 import seaborn as sns
-from mlxtend.preprocessing import TransactionEncoder
-from mlxtend.frequent_patterns import apriori, association_rules
 from adjustText import adjust_text
 
-start_time = time.time()
-# 设置中文与输出路径
-sns.set_theme(style="whitegrid")
-plt.rcParams['font.family'] = 'SimHei'
-plt.rcParams['axes.unicode_minus'] = False
-
-# === Step 1: 读取数据并筛选退款订单 ===
-print("正在加载 structured_transactions.csv，并筛选退款订单")
-df = pd.read_csv("../data/processed_10G_data/structured_transactions.csv")
-df["main_categories"] = df["main_categories"].apply(ast.literal_eval)
-df_refund = df[df["payment_status"].isin(["已退款", "部分退款"])].copy()
-
-# === Step 2: 构造商品组合事务列表 ===
-print("正在进行退款规则挖掘")
-transactions = df_refund["main_categories"].tolist()
-te = TransactionEncoder()
-te_array = te.fit(transactions).transform(transactions)
-basket_df = pd.DataFrame(te_array, columns=te.columns_)
-
-# === Step 3: Apriori 挖掘规则 ===
-frequent_itemsets = apriori(basket_df, min_support=0.005, use_colnames=True)
-rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=0.4)
-if rules.empty:
-    print("没有满足置信度规则的结果，尝试使用confidence > 0.2")
-    rules_all = association_rules(frequent_itemsets, metric="confidence", min_threshold=0.2)
-if rules.empty:
-    print("没有满足置信度规则的结果，尝试使用confidence > 0.05")
-    rules_all = association_rules(frequent_itemsets, metric="confidence", min_threshold=0.05)
-rules = rules.round(3)
-
-# === Step 4: 保存规则表格 ===
-rules.to_csv("../data/processed_10G_data/refund_category_rules.csv", index=False)
-print("已保存全部规则，即将进行可视化")
-
-# === Step 5: 可视化 Top 15 规则（提升度最高） ===
-top_rules = rules.sort_values(by="lift", ascending=False).head(15)
-
-plt.figure(figsize=(10, 6))
-scatter = plt.scatter(
-    top_rules["support"],
-    top_rules["confidence"],
-    s=top_rules["lift"] * 300,
-    c=top_rules["lift"],
-    cmap="viridis",
-    alpha=0.8,
-    edgecolors="black"
-)
-texts = []
-for _, row in top_rules.iterrows():
-    ant = ",".join(row["antecedents"])
-    con = ",".join(row["consequents"])
-    label = f"{ant}→{con}"
-    texts.append(plt.text(row["support"], row["confidence"], label, fontsize=9))
-
-adjust_text(texts, only_move={"points": "y", "text": "xy"}, arrowprops=dict(arrowstyle="->", color="gray"))
-cbar = plt.colorbar(scatter, pad=0.01)
-cbar.set_label("提升度 (Lift)", fontsize=10)
-plt.xlabel("支持度 (Support)")
-plt.ylabel("置信度 (Confidence)")
-plt.title("退款商品组合规则：支持度 vs 置信度 vs 提升度")
-plt.tight_layout()
-plt.savefig("../data/figs_10G_data/refund_rules_bubble_chart.png")
-plt.close()
-
-end_time = time.time()
-total_time = end_time - start_time
-print(f"总耗时{total_time:.2f} 秒")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.figures import render_figures
+from common.dataset import dataset_size, processed_folder, figs_folder
+from common.transactions_io import load_transactions, category_order
+from rule_mining import sort_rules, category_baskets, collapse_baskets, load_or_find_itemsets, all_rules, select_rules
+
+# ==== 路径设置（数据集规模可由环境变量 DATASET 指定） ====
+data_folder = processed_folder(dataset_size('10G'))
+save_folder = figs_folder(dataset_size('10G'))
+
+# ==== 频繁项集挖掘引擎：bitset / apriori / fpgrowth（见 rule_mining.find_itemsets） ====
+mining_engine = "bitset"
+
+# ==== 规则阈值阶梯：依次尝试，取第一个有结果的档位 ====
+rule_ladder = [("confidence", 0.4), ("confidence", 0.2), ("confidence", 0.05)]
+
+
+# 设置中文与输出路径（每个渲染进程中设置）
+def setup_style():
+    sns.set_theme(style="whitegrid")
+    plt.rcParams['font.family'] = 'SimHei'
+    plt.rcParams['axes.unicode_minus'] = False
+
+
+# === 可视化 Top 15 规则（提升度最高） ===
+def render_bubble_chart(top_rules, output_path):
+    plt.figure(figsize=(10, 6))
+    scatter = plt.scatter(
+        top_rules["support"],
+        top_rules["confidence"],
+        s=top_rules["lift"] * 300,
+        c=top_rules["lift"],
+        cmap="viridis",
+        alpha=0.8,
+        edgecolors="black"
+    )
+    texts = []
+    for _, row in top_rules.iterrows():
+        ant = ",".join(sorted(row["antecedents"]))
+        con = ",".join(sorted(row["consequents"]))
+        label = f"{ant}→{con}"
+        texts.append(plt.text(row["support"], row["confidence"], label, fontsize=9))
+
+    adjust_text(texts, only_move={"points": "y", "text": "xy"}, arrowprops=dict(arrowstyle="->", color="gray"))
+    cbar = plt.colorbar(scatter, pad=0.01)
+    cbar.set_label("提升度 (Lift)", fontsize=10)
+    plt.xlabel("支持度 (Support)")
+    plt.ylabel("置信度 (Confidence)")
+    plt.title("退款商品组合规则：支持度 vs 置信度 vs 提升度")
+    plt.tight_layout()
+    plt.savefig(output_path)
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+
+    # === Step 1: 读取数据并筛选退款订单 ===
+    print("正在加载 structured_transactions，并筛选退款订单")
+    df = load_transactions(data_folder)
+    df_refund = df[df["payment_status"].isin(["已退款", "部分退款"])].copy()
+
+    # === Step 2: 构造商品组合事务（类别位掩码，相同事务合并计数） ===
+    print("正在进行退款规则挖掘")
+    masks, items = category_baskets(df_refund, category_order(data_folder))
+    baskets, counts = collapse_baskets(masks)
+
+    # === Step 3: 频繁项集挖掘与规则生成 ===
+    frequent_itemsets = load_or_find_itemsets(baskets, counts, items, 0.005, os.path.join(data_folder, "_itemset_cache"),
+                                              "refund", engine=mining_engine)
+    rules, _ = select_rules(all_rules(frequent_itemsets), rule_ladder)
+    rules = sort_rules(rules.round(3))
+
+    # === Step 4: 保存规则表格 ===
+    rules.to_csv(os.path.join(data_folder, "refund_category_rules.csv"), index=False)
+    print("已保存全部规则，即将进行可视化")
+
+    # === Step 5: 可视化 Top 15 规则（输入未变化时跳过） ===
+    top_rules = rules.sort_values(by="lift", ascending=False).head(15)
+    render_figures([
+        (os.path.join(save_folder, "refund_rules_bubble_chart.png"), render_bubble_chart, top_rules),
+    ], setup=setup_style)
+
+    end_time = time.time()
+    total_time = end_time - start_time
+    print(f"总耗时{total_time:.2f} 秒")
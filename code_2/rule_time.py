@@ -1,109 +1,193 @@
+import os
+import sys
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-import ast
 import time
-from collections import Counter
-
-start_time = time.time()
-# 设置中文字体和输出目录
-sns.set_theme(style='whitegrid')
-plt.rcParams['font.family'] = 'SimHei'
-plt.rcParams['axes.unicode_minus'] = False
-
-# === Step 1: 数据加载与时间字段解析 ===
-print("正在加载 structured_transactions.csv，并进行时间字段解析")
-df = pd.read_csv("../data/processed_10G_data/structured_transactions.csv")
-df["main_categories"] = df["main_categories"].apply(ast.literal_eval)
-df["purchase_date"] = pd.to_datetime(df["purchase_date"])
-df["year"] = df["purchase_date"].dt.year
-df["month"] = df["purchase_date"].dt.month
-df["quarter"] = df["purchase_date"].dt.quarter
-df["weekday"] = df["purchase_date"].dt.dayofweek  # 0=周一
-
-# === Step 2: 季节性购物行为分析 ===
-print("正在进行季节性购物行为分析")
-df["month"].value_counts().sort_index().plot(kind='bar', figsize=(8, 4))
-plt.title("每月购物行为统计")
-plt.xlabel("月份")
-plt.ylabel("购物记录数")
-plt.tight_layout()
-plt.savefig("../data/figs_10G_data/purchase_by_month.png")
-plt.close()
-
-df["quarter"].value_counts().sort_index().plot(kind='bar', color='orange', figsize=(6, 4))
-plt.title("每季度购物行为统计")
-plt.xlabel("季度")
-plt.ylabel("购物记录数")
-plt.tight_layout()
-plt.savefig("../data/figs_10G_data/purchase_by_quarter.png")
-plt.close()
-
-df["weekday"].value_counts().sort_index().plot(kind='bar', color='green', figsize=(6, 4))
-plt.title("每周购物行为统计")
-plt.xlabel("星期")
-plt.ylabel("购物记录数")
-plt.tight_layout()
-plt.savefig("../data/figs_10G_data/purchase_by_weekday.png")
-plt.close()
-
-# === Step 3: 商品类别-时间频率变化分析（按月） ===
-print("正在进行商品类别-时间频率变化分析")
-category_month_rows = []
-for _, row in df.iterrows():
-    for cat in row["main_categories"]:
-        category_month_rows.append({"category": cat, "month": row["month"]})
-
-cat_month_df = pd.DataFrame(category_month_rows)
-pivot = cat_month_df.value_counts(["month", "category"]).unstack().fillna(0)
-pivot.plot(kind="bar", stacked=True, colormap="tab20", figsize=(12, 6))
-plt.title("每月各商品类别的购买频次")
-plt.xlabel("月份")
-plt.ylabel("记录数")
-plt.legend(loc='upper right', bbox_to_anchor=(1.15, 1.0))
-plt.tight_layout()
-plt.savefig("../data/figs_10G_data/category_by_month_stackedbar.png")
-plt.close()
-
-# === Step 4: 用户购买顺序模式（A类→B类）分析 ===
-print("正在进行用户购买顺序模式分析")
-# 若无 user_id 列则自动生成
-if "user_id" not in df.columns:
-    df["user_id"] = df.index
-# 对每个用户构建购买序列
-df_sorted = df.sort_values(by=["user_id", "purchase_date"])
-user_sequences = {}
-for user, group in df_sorted.groupby("user_id"):
-    sequence = []
-    for _, row in group.iterrows():
-        sequence.extend(sorted(set(row["main_categories"])))  # 保证一致性
-    user_sequences[user] = sequence
-# 提取相邻类别转移对
-transitions = []
-for seq in user_sequences.values():
-    for i in range(len(seq) - 1):
-        transitions.append((seq[i], seq[i+1]))
-# 统计转移频率
-trans_count = Counter(transitions)
-trans_df = pd.DataFrame(trans_count.items(), columns=["Transition", "Count"]).sort_values(by="Count", ascending=False)
-trans_df[["From", "To"]] = pd.DataFrame(trans_df["Transition"].tolist(), index=trans_df.index)
-trans_df.drop(columns="Transition", inplace=True)
-# 保存与可视化
-trans_df.to_csv("../data/processed_10G_data/category_transitions.csv", index=False)
-plt.figure(figsize=(10, 6))
-sns.barplot(
-    data=trans_df.head(15),
-    x="Count",
-    y=trans_df.head(15).apply(lambda x: f"{x['From']}→{x['To']}", axis=1)
-)
-plt.title("Top 15 类别顺序转移模式")
-plt.xlabel("转移次数")
-plt.ylabel("转移路径")
-plt.tight_layout()
-plt.savefig("../data/figs_10G_data/top15_category_transitions.png")
-plt.close()
-
-end_time = time.time()
-total_time = end_time - start_time
-print(f"总耗时{total_time:.2f} 秒")
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.figures import render_figures
+from common.dataset import dataset_size, processed_folder, figs_folder
+from common.transactions_io import load_transactions, category_order, transaction_files
+from rule_mining import category_baskets
+from transitions import flatten_sequences, count_transitions, transitions_frame
+from external_sequences import external_transitions
+
+# ==== 路径设置（数据集规模可由环境变量 DATASET 指定） ====
+data_folder = processed_folder(dataset_size('10G'))
+save_folder = figs_folder(dataset_size('10G'))
+
+# ==== 类别转移统计 ====
+# transition_steps：除相邻转移（1 步）外额外统计的步长，例如 [2, 3]；
+# transition_period：None / 'month' / 'quarter' / 'year'，按转移终点所在时间段另外输出转移计数
+transition_steps = []
+transition_period = None
+
+# ==== 外部排序模式：交易记录过多、无法整体载入内存时启用 ====
+# 分批读取 structured_transactions 分片，计数立方体逐批累加，购买序列按 user_id 哈希分区溢写后逐分区统计转移；
+# 内存占用只与单个批次和单个分区的大小有关
+external_sort = False
+sort_partitions = 64
+sort_batch_size = 1_000_000
+sort_work_dir = os.path.join(data_folder, "_sequence_spill")
+
+
+# 设置中文字体（每个渲染进程中设置）
+def setup_style():
+    sns.set_theme(style='whitegrid')
+    plt.rcParams['font.family'] = 'SimHei'
+    plt.rcParams['axes.unicode_minus'] = False
+
+
+# === 月 × 星期 × 季度 × 类别 计数立方体 ===
+# 每行对应一个 (月, 星期) 组合（季度由月份决定），purchases 为购物记录数，其余列为各大类出现次数；
+# 一次线性扫描得到，季节性柱状图与类别堆叠图都由它汇总而来
+def build_time_cube(purchase_date, masks, categories):
+    valid = purchase_date.notna().to_numpy()
+    month = purchase_date.dt.month.to_numpy()[valid].astype(np.int64)
+    weekday = purchase_date.dt.dayofweek.to_numpy()[valid].astype(np.int64)
+    masks = masks[valid]
+    key = (month - 1) * 7 + weekday
+
+    cube = pd.DataFrame({
+        "month": np.repeat(np.arange(1, 13), 7),
+        "weekday": np.tile(np.arange(7), 12),
+    })
+    cube["quarter"] = (cube["month"] - 1) // 3 + 1
+    cube["purchases"] = np.bincount(key, minlength=84)
+    for i, cat in enumerate(categories):
+        cube[cat] = np.bincount(key[((masks >> i) & 1).astype(bool)], minlength=84)
+    return cube
+
+
+# === 合并多个批次的立方体（计数列直接相加） ===
+def merge_cubes(cubes):
+    cube = cubes[0].copy()
+    count_columns = cube.columns[3:]
+    cube[count_columns] = sum(c[count_columns].to_numpy() for c in cubes)
+    return cube
+
+
+# === 从立方体汇总某一维度的购物记录数（去掉记录数为 0 的取值，与 value_counts 一致） ===
+def cube_counts(cube, dim):
+    counts = cube.groupby(dim)["purchases"].sum()
+    return counts[counts > 0]
+
+
+# === 季节性购物行为柱状图（月 / 季度 / 星期） ===
+def render_count_bar(data, output_path):
+    data['counts'].sort_index().plot(kind='bar', color=data['color'], figsize=data['figsize'])
+    plt.title(data['title'])
+    plt.xlabel(data['xlabel'])
+    plt.ylabel("购物记录数")
+    plt.tight_layout()
+    plt.savefig(output_path)
+
+
+# === 每月各商品类别的购买频次（堆叠柱状图） ===
+def render_category_by_month(pivot, output_path):
+    pivot.plot(kind="bar", stacked=True, colormap="tab20", figsize=(12, 6))
+    plt.title("每月各商品类别的购买频次")
+    plt.xlabel("月份")
+    plt.ylabel("记录数")
+    plt.legend(loc='upper right', bbox_to_anchor=(1.15, 1.0))
+    plt.tight_layout()
+    plt.savefig(output_path)
+
+
+# === Top 15 类别顺序转移模式 ===
+def render_top_transitions(top_trans, output_path):
+    plt.figure(figsize=(10, 6))
+    sns.barplot(
+        data=top_trans,
+        x="Count",
+        y=top_trans.apply(lambda x: f"{x['From']}→{x['To']}", axis=1)
+    )
+    plt.title("Top 15 类别顺序转移模式")
+    plt.xlabel("转移次数")
+    plt.ylabel("转移路径")
+    plt.tight_layout()
+    plt.savefig(output_path)
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+
+    steps = sorted({1, *transition_steps})
+    if external_sort:
+        # === Step 1-2（外部排序模式）：分批构建计数立方体，同时按 user_id 分区溢写并统计类别转移 ===
+        print("外部排序模式：分批读取 structured_transactions，构建时间-类别计数立方体并按用户分区统计转移")
+        categories = category_order(data_folder)
+        if categories is None:
+            print("错误：外部排序模式需要 parquet 格式的 structured_transactions，请先重新运行 transaction.py。")
+            exit(1)
+        batch_cubes = []
+        matrices, by_period = external_transitions(
+            transaction_files(data_folder), categories, sort_work_dir,
+            num_partitions=sort_partitions, batch_size=sort_batch_size, steps=steps, period=transition_period,
+            on_batch=lambda dates, masks: batch_cubes.append(build_time_cube(dates, masks, categories)))
+        cube = merge_cubes(batch_cubes)
+    else:
+        # === Step 1: 数据加载与时间字段提取（purchase_date 已是时间戳） ===
+        print("正在加载 structured_transactions，并提取时间字段")
+        df = load_transactions(data_folder)
+
+        # === Step 2: 构建 月 × 星期(0=周一) × 季度 × 类别 计数立方体 ===
+        print("正在构建时间-类别计数立方体")
+        masks, categories = category_baskets(df, category_order(data_folder))
+        cube = build_time_cube(df["purchase_date"], masks, categories)
+    cube.to_csv(os.path.join(data_folder, "time_category_cube.csv"), index=False)
+
+    # === Step 3: 季节性购物行为分析 ===
+    print("正在进行季节性购物行为分析")
+    figure_jobs = [
+        (os.path.join(save_folder, "purchase_by_month.png"), render_count_bar,
+         {'counts': cube_counts(cube, "month"), 'color': None, 'figsize': (8, 4),
+          'title': "每月购物行为统计", 'xlabel': "月份"}),
+        (os.path.join(save_folder, "purchase_by_quarter.png"), render_count_bar,
+         {'counts': cube_counts(cube, "quarter"), 'color': 'orange', 'figsize': (6, 4),
+          'title': "每季度购物行为统计", 'xlabel': "季度"}),
+        (os.path.join(save_folder, "purchase_by_weekday.png"), render_count_bar,
+         {'counts': cube_counts(cube, "weekday"), 'color': 'green', 'figsize': (6, 4),
+          'title': "每周购物行为统计", 'xlabel': "星期"}),
+    ]
+
+    # === Step 4: 商品类别-时间频率变化分析（按月，由立方体汇总） ===
+    print("正在进行商品类别-时间频率变化分析")
+    pivot = cube.groupby("month")[categories].sum()
+    pivot = pivot.loc[pivot.sum(axis=1) > 0, sorted(c for c in categories if pivot[c].sum() > 0)]
+    pivot.columns.name = "category"
+    figure_jobs.append((os.path.join(save_folder, "category_by_month_stackedbar.png"), render_category_by_month, pivot))
+
+    # === Step 5: 用户购买顺序模式（A类→B类）分析 ===
+    print("正在进行用户购买顺序模式分析")
+    names = sorted(categories)
+    if not external_sort:
+        # 若无 user_id 列则自动生成
+        if "user_id" not in df.columns:
+            df["user_id"] = df.index
+        # 按用户、日期排序后展开为扁平的类别序列（记录内按类别名称排序），再由错位比较统计转移
+        users, codes, dates = flatten_sequences(df["user_id"], df["purchase_date"], masks, categories)
+        matrices, by_period = count_transitions(users, codes, dates, len(names), steps=steps, period=transition_period)
+    # 保存与可视化
+    trans_df = transitions_frame(matrices[1], names)
+    trans_df.to_csv(os.path.join(data_folder, "category_transitions.csv"), index=False)
+    pd.DataFrame(matrices[1], index=pd.Index(names, name="From"), columns=names).to_csv(
+        os.path.join(data_folder, "category_transition_matrix.csv"))
+    for k in transition_steps:
+        transitions_frame(matrices[k], names).to_csv(
+            os.path.join(data_folder, f"category_transitions_k{k}.csv"), index=False)
+    if by_period:
+        period_df = pd.concat([transitions_frame(m, names).assign(Period=p) for p, m in sorted(by_period.items())])
+        period_df[["Period", "From", "To", "Count"]].to_csv(
+            os.path.join(data_folder, f"category_transitions_by_{transition_period}.csv"), index=False)
+    figure_jobs.append((os.path.join(save_folder, "top15_category_transitions.png"), render_top_transitions,
+                        trans_df.head(15)))
+
+    # === 并行渲染全部图像（输入未变化的图像直接跳过） ===
+    render_figures(figure_jobs, setup=setup_style)
+
+    end_time = time.time()
+    total_time = end_time - start_time
+    print(f"总耗时{total_time:.2f} 秒")
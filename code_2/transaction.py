@@ -1,21 +1,46 @@
 import os
 import pandas as pd
-import json
+import numpy as np
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
 import gc
-
-# ==== 路径设置 ====
-csv_folder = '../data/processed_30G_data'
-csv_files = [f for f in os.listdir(csv_folder) if f.endswith('_processed.csv')]
-product_catalog_path = '../data/product_catalog.json'
-
-# ==== 初始化记录列表 ====
-records = []
-
-# ==== 加载商品目录映射 ====
-with open(product_catalog_path, 'r', encoding='utf-8') as f:
-    catalog = json.load(f)
-product_map = {item['id']: item for item in catalog['products']}  # ID -> 商品信息
+import sys
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.processed_io import list_processed_files, read_processed
+from common.json_fields import decode_json_column
+from common.dataset import dataset_size, processed_folder, catalog_path, worker_count
+from catalog_index import load_catalog_index, category_masks, masks_to_lists
+
+# ==== 路径设置（数据集规模可由环境变量 DATASET 指定） ====
+dataset = dataset_size('30G')
+csv_folder = processed_folder(dataset)
+csv_files = list_processed_files(csv_folder)
+product_catalog_path = catalog_path(dataset)
+
+# ==== 输出配置 ====
+# 每个输入文件由一个进程处理并写出自己的 parquet 分片，下游 rule_*.py 可直接读取分片目录；
+# merge_shards = True 时再额外合并为单个 structured_transactions.parquet。
+# main_categories 为原生 list<string> 列，同时保存类别位掩码 category_mask（位序记录在 schema 元数据中），
+# purchase_date 为时间戳，payment_method / payment_status 为字典编码
+shard_folder = os.path.join(csv_folder, 'structured_transactions')
+merged_path = os.path.join(csv_folder, 'structured_transactions.parquet')
+merge_shards = False
+num_workers = worker_count()
+purchase_fields = ['payment_method', 'payment_status', 'avg_price', 'purchase_date', 'items[].id']
+# 分片的固定 schema：没有有效记录的文件也写出同样类型的空分片，下游可直接合并
+shard_schema = pa.schema([
+    ('user_id', pa.int64()),
+    ('purchase_date', pa.timestamp('us')),
+    ('main_categories', pa.list_(pa.string())),
+    ('category_mask', pa.int64()),
+    ('payment_method', pa.dictionary(pa.int32(), pa.string())),
+    ('payment_status', pa.dictionary(pa.int32(), pa.string())),
+    ('price', pa.float64()),
+])
 
 # ==== 小类 → 大类映射 ====
 subcategory_to_category = {
@@ -33,70 +58,125 @@ subcategory_to_category = {
     "车载电子": "汽车用品", "汽车装饰": "汽车用品"
 }
 
+# ==== 商品目录索引（商品 ID -> 大类编号，目录变化时自动重新编译），每个进程加载一次 ====
+catalog_index = None
 
-# ==== JSON 解析函数 ====
-def parse_purchase_json(purchase_str):
-    try:
-        fixed = purchase_str.replace('""', '"')
-        return json.loads(fixed)
-    except:
-        return {}
 
-print("\n正在提取 purchase_history 中的结构化信息...")
+def _init_worker():
+    global catalog_index
+    catalog_index = load_catalog_index(product_catalog_path, subcategory_to_category)
+
+
+# ==== 判断字段是否为非空值（与 all([...]) 的真值判断一致） ====
+def is_present(series):
+    return (series.notna() & (series.astype(str) != '')).to_numpy()
+
+
+# ==== 解码购买记录并写出分片，返回 (记录数, 解析失败条数) ====
+def _write_shard(df, shard_path):
+    p_hist, failures = decode_json_column(df['purchase_history'], purchase_fields, numeric_fields=['avg_price'],
+                                          string_fields=['payment_method', 'payment_status'])
+
+    # 批量展开商品并映射为大类，按记录聚合为类别位掩码
+    items = p_hist['items[].id'].reset_index(drop=True).explode().dropna()
+    masks = category_masks(catalog_index, items.index.to_numpy(), items.to_numpy(), len(p_hist))
+
+    price = p_hist['avg_price'].to_numpy()
+    valid = (
+        (masks > 0) &
+        is_present(p_hist['payment_method']) &
+        is_present(p_hist['payment_status']) &
+        is_present(p_hist['purchase_date']) &
+        ~np.isnan(price) & (price != 0)
+    )
+    shard = pd.DataFrame({
+        'user_id': df['id'].to_numpy()[valid],
+        'purchase_date': p_hist['purchase_date'].to_numpy()[valid],
+        'main_categories': masks_to_lists(masks[valid], catalog_index['categories']).to_numpy(),
+        'category_mask': masks[valid],
+        'payment_method': pd.Categorical(p_hist['payment_method'].to_numpy()[valid]),
+        'payment_status': pd.Categorical(p_hist['payment_status'].to_numpy()[valid]),
+        'price': price[valid]
+    })
+    shard['purchase_date'] = pd.to_datetime(shard['purchase_date'], errors='coerce')
 
-# ==== 处理csv文件 ====
-for file in tqdm(csv_files, desc="处理 CSV 文件"):
+    table = pa.Table.from_pandas(shard, schema=shard_schema, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b'main_categories'] = json.dumps(catalog_index['categories'], ensure_ascii=False).encode('utf-8')
+    pq.write_table(table.replace_schema_metadata(metadata), shard_path, compression='zstd')
+
+    return len(shard), failures
+
+
+# ==== 处理单个文件并写出分片，返回 (文件名, 记录数, 解析失败条数, 错误) ====
+def extract_file(file):
     file_path = os.path.join(csv_folder, file)
+    shard_path = os.path.join(shard_folder, f"{os.path.splitext(file)[0]}.parquet")
 
     try:
-        df = pd.read_csv(file_path, usecols=['id', 'purchase_history'])
+        df = read_processed(file_path, columns=['id', 'purchase_history'])
     except Exception as e:
-        print(f"文件读取失败：{file}，跳过。")
-        continue
-
-    for _, row in df.iterrows():
-        user_id = row['id']
-        p_json = parse_purchase_json(row['purchase_history'])
-        item_list = p_json.get('items', [])
-        if not isinstance(item_list, list) or len(item_list) == 0:
-            continue
-
-        method = p_json.get('payment_method')
-        status = p_json.get('payment_status')
-        price = p_json.get('avg_price')
-        date = p_json.get('purchase_date')
-        category_set = set()
-        for item in item_list:
-            item_id = item.get('id')
-            if item_id not in product_map:
-                continue
-            subcategory = product_map[item_id]['category']
-            main_category = subcategory_to_category.get(subcategory)
-            if main_category:
-                category_set.add(main_category)
-
-        if category_set and all([method, status, price, date]):
-            records.append({
-                'user_id': user_id,
-                'purchase_date': date,
-                'main_categories': list(category_set),
-                'payment_method': method,
-                'payment_status': status,
-                'price': float(price)
-            })
+        return file, 0, 0, e
 
+    # 转换或写出失败时只跳过该文件，并删除可能写了一半的分片
+    try:
+        rows, failures = _write_shard(df, shard_path)
+    except Exception as e:
+        if os.path.isfile(shard_path):
+            os.remove(shard_path)
+        return file, 0, 0, e
     del df
     gc.collect()
-
-# === 构造 DataFrame 与导出 ===
-if not records:
-    print("错误：所有记录都无效，无法构建 transactions_df，请检查字段解析逻辑。")
-    exit(1)
-
-# 构建 DataFrame 并转换时间格式
-transactions_df = pd.DataFrame(records)
-transactions_df['purchase_date'] = pd.to_datetime(transactions_df['purchase_date'], errors='coerce')
-
-# 保存结果
-transactions_df.to_csv('../data/processed_30G_data/structured_transactions.csv', index=False)
-print(f"成功保存结构化数据，共 {len(transactions_df)} 条记录。")
+    return file, rows, failures, None
+
+
+if __name__ == '__main__':
+    print("\n正在提取 purchase_history 中的结构化信息...")
+
+    # 清理上一次运行留下的分片
+    os.makedirs(shard_folder, exist_ok=True)
+    for f in os.listdir(shard_folder):
+        os.remove(os.path.join(shard_folder, f))
+
+    # 先在主进程中编译（或校验）商品目录缓存，子进程直接读取缓存
+    _init_worker()
+
+    # ==== 并行处理预处理文件，每个文件写出一个分片 ====
+    workers = max(1, min(num_workers, len(csv_files)))
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        results = executor.map(extract_file, csv_files)
+    else:
+        executor = None
+        results = map(extract_file, csv_files)
+
+    total_rows = 0
+    parse_failures = 0
+    for file, rows, failures, error in tqdm(results, total=len(csv_files), desc="处理预处理文件"):
+        if error is not None:
+            print(f"文件处理失败：{file}（{error}），跳过。")
+            continue
+        total_rows += rows
+        parse_failures += failures
+    if executor is not None:
+        executor.shutdown()
+
+    print(f"purchase_history 解析失败 {parse_failures} 条")
+
+    # === 检查结果 ===
+    if total_rows == 0:
+        print("错误：所有记录都无效，无法构建 transactions_df，请检查字段解析逻辑。")
+        exit(1)
+    print(f"成功保存结构化数据分片：{shard_folder}，共 {total_rows} 条记录。")
+
+    # === 可选：合并为单个文件（逐个分片追加，内存只与单个分片有关） ===
+    if merge_shards:
+        writer = None
+        for shard_file in sorted(os.listdir(shard_folder)):
+            table = pq.read_table(os.path.join(shard_folder, shard_file))
+            if writer is None:
+                writer = pq.ParquetWriter(merged_path, table.schema, compression='zstd')
+            writer.write_table(table.cast(writer.schema))
+        if writer is not None:
+            writer.close()
+        print(f"已合并为单个文件：{merged_path}")
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+# ==== 用户购买顺序中的类别转移统计 ====
+# 每个用户的购买记录按 purchase_date 排序（缺失日期排在最后），每条记录内的大类按名称排序，
+# 依次拼接为该用户的类别序列；序列中相距 k 个位置、属于同一用户的两个类别构成一次 k 步转移。
+# 全部用向量化的排序与错位比较完成，计数结果为 类别 × 类别 的稠密矩阵（行 = From，列 = To）
+PERIODS = {'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+
+# ==== 构建扁平化的类别序列 ====
+# 返回 (用户编号, 类别编号, 所属购买记录的日期)，按用户、日期、类别名称排好序；类别编号对应 sorted(categories)
+def flatten_sequences(user_id, purchase_date, masks, categories):
+    user_codes = pd.factorize(pd.Series(user_id), sort=True)[0]
+    dates = pd.Series(purchase_date).to_numpy(dtype='datetime64[ns]')
+    date_keys = dates.view(np.int64).copy()
+    date_keys[np.isnat(dates)] = np.iinfo(np.int64).max
+    # 稳定排序：同一用户同一时间的记录保持原有顺序
+    order = np.lexsort((date_keys, user_codes))
+
+    names = sorted(categories)
+    masks = np.asarray(masks, dtype=np.int64)[order]
+    positions, codes = [], []
+    for rank, name in enumerate(names):
+        hit = np.flatnonzero((masks >> list(categories).index(name)) & 1)
+        positions.append(hit)
+        codes.append(np.full(len(hit), rank, dtype=np.int64))
+    positions = np.concatenate(positions)
+    codes = np.concatenate(codes)
+    # 按购买记录的先后排列，同一记录内按类别名称排列
+    seq = np.lexsort((codes, positions))
+    positions = positions[seq]
+    return user_codes[order][positions], codes[seq], dates[order][positions]
+
+
+# ==== 统计转移次数 ====
+# steps 为需要统计的步长；period 为 None / 'month' / 'quarter' / 'year'，
+# 不为空时另外按转移终点所在的时间段统计 1 步转移。
+# 返回 ({k: 矩阵}, {时间段: 矩阵})，矩阵为 int64，多个分区的结果可直接相加
+def count_transitions(users, codes, dates, n_categories, steps=(1,), period=None):
+    size = n_categories * n_categories
+    matrices = {}
+    for k in steps:
+        same_user = users[:-k] == users[k:] if len(users) > k else np.zeros(0, dtype=bool)
+        pairs = codes[:-k][same_user] * n_categories + codes[k:][same_user]
+        matrices[k] = np.bincount(pairs, minlength=size).reshape(n_categories, n_categories)
+
+    by_period = {}
+    if period is not None and len(users) > 1:
+        same_user = users[:-1] == users[1:]
+        pairs = codes[:-1][same_user] * n_categories + codes[1:][same_user]
+        labels = pd.PeriodIndex(dates[1:][same_user], freq=PERIODS[period])
+        period_codes, uniques = pd.factorize(labels)
+        valid = period_codes >= 0
+        counts = np.bincount(period_codes[valid] * size + pairs[valid], minlength=len(uniques) * size)
+        for i, label in enumerate(uniques):
+            by_period[str(label)] = counts[i * size:(i + 1) * size].reshape(n_categories, n_categories)
+    return matrices, by_period
+
+
+# ==== 合并多个分区的转移计数 ====
+def merge_transitions(total, part):
+    for key, matrix in part.items():
+        total[key] = total[key] + matrix if key in total else matrix.copy()
+    return total
+
+
+# ==== 转移矩阵 → (Count, From, To) 表，只保留出现过的转移，按次数降序 ====
+def transitions_frame(matrix, names):
+    src, dst = np.nonzero(matrix)
+    frame = pd.DataFrame({
+        "Count": matrix[src, dst],
+        "From": np.asarray(names, dtype=object)[src],
+        "To": np.asarray(names, dtype=object)[dst],
+    })
+    return frame.sort_values(by=["Count", "From", "To"], ascending=[False, True, True],
+                             kind="mergesort").reset_index(drop=True)
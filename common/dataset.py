@@ -0,0 +1,45 @@
+import os
+
+# ==== 数据集规模与目录 ====
+# 各脚本用 dataset_size(默认规模) 取得本次使用的数据集：默认值保持脚本原来使用的数据集，
+# 设置环境变量 DATASET（如 10G / 30G，run_pipeline.py --dataset 会自动设置）时全部脚本统一切换。
+# 目录相对于脚本所在的 code_1 / code_2 目录
+DATA_ROOT = '../data'
+
+
+def dataset_size(default):
+    return os.environ.get('DATASET') or default
+
+
+# ==== 原始数据目录，如 ../data/10G_data ====
+def raw_folder(size):
+    return f"{DATA_ROOT}/{size}_data"
+
+
+# ==== 预处理结果目录，如 ../data/processed_10G_data ====
+def processed_folder(size):
+    return f"{DATA_ROOT}/processed_{size}_data"
+
+
+# ==== 图像目录，如 ../data/figs_10G_data ====
+def figs_folder(size):
+    return f"{DATA_ROOT}/figs_{size}_data"
+
+
+# ==== 商品目录：原始数据目录中有 product_catalog.json（如合成数据集）时优先使用，否则为 ../data/product_catalog.json ====
+def catalog_path(size):
+    own = f"{raw_folder(size)}/product_catalog.json"
+    return own if os.path.exists(own) else f"{DATA_ROOT}/product_catalog.json"
+
+
+# ==== 并行进程数与内存预算 ====
+# run_pipeline.py 并发运行多个阶段时，通过环境变量 WORKERS / MEMORY_BUDGET_GB 把总核数与总内存预算
+# 分给每个阶段；单独运行脚本时未设置这两个变量，使用脚本原来的默认值（全部核数 / 脚本中的预算）
+def worker_count():
+    value = os.environ.get('WORKERS')
+    return max(1, int(value)) if value else (os.cpu_count() or 1)
+
+
+def memory_budget(default_gb):
+    value = os.environ.get('MEMORY_BUDGET_GB')
+    return float(value) if value else default_gb
@@ -0,0 +1,130 @@
+import os
+import hashlib
+import inspect
+import numpy as np
+import pandas as pd
+import matplotlib
+from concurrent.futures import ProcessPoolExecutor
+
+from common.dataset import worker_count
+from common.fingerprint import atomic_write_text
+
+# ==== 图像渲染阶段 ====
+# 每个图像是一个 (输出路径, 绘图函数, 输入数据) 三元组。绘图函数必须定义在模块顶层，
+# 签名为 func(data, output_path)。输入数据与绘图函数源码的哈希与上次渲染一致且 PNG 仍存在时跳过，
+# 其余图像在使用非交互式后端的子进程中并行渲染。
+# 哈希保存在每张图旁边的 <文件名>.sha256 中（每张图一个文件），
+# 多个脚本同时向同一图像目录绘图时互不覆盖对方的记录
+HASH_SUFFIX = '.sha256'
+
+
+def _read_digest(output_path):
+    try:
+        with open(output_path + HASH_SUFFIX, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _write_digest(output_path, digest):
+    atomic_write_text(output_path + HASH_SUFFIX, digest)
+
+
+# ==== 计算输入数据的稳定哈希（与进程、集合迭代顺序无关） ====
+def _update_hash(h, obj):
+    if isinstance(obj, pd.DataFrame):
+        h.update(b'DF')
+        _update_hash(h, [str(c) for c in obj.columns])
+        _update_hash(h, obj.index)
+        for col in obj.columns:
+            _update_hash(h, obj[col])
+    elif isinstance(obj, (pd.Series, pd.Index)):
+        h.update(b'S' + str(obj.dtype).encode())
+        _update_hash(h, obj.to_numpy())
+        if isinstance(obj, pd.Series):
+            _update_hash(h, obj.index)
+    elif isinstance(obj, np.ndarray):
+        h.update(b'A' + str(obj.dtype).encode() + str(obj.shape).encode())
+        # 只有定长数值类型按字节哈希，字符串、对象等按元素内容哈希
+        if obj.dtype.kind in 'biufcmM':
+            h.update(np.ascontiguousarray(obj).tobytes())
+        else:
+            _update_hash(h, obj.tolist())
+    elif isinstance(obj, dict):
+        h.update(b'D')
+        items = sorted(obj.items(), key=lambda kv: repr(kv[0]))
+        for k, v in items:
+            _update_hash(h, k)
+            _update_hash(h, v)
+    elif isinstance(obj, (set, frozenset)):
+        h.update(b'Z')
+        for v in sorted(obj, key=repr):
+            _update_hash(h, v)
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'L' + str(len(obj)).encode())
+        for v in obj:
+            _update_hash(h, v)
+    elif isinstance(obj, np.random.Generator):
+        # 随机数状态不影响图像内容
+        h.update(b'G')
+    else:
+        h.update(repr(obj).encode('utf-8'))
+    h.update(b';')
+
+
+def figure_hash(render_func, data):
+    h = hashlib.sha256()
+    h.update(render_func.__qualname__.encode('utf-8'))
+    try:
+        h.update(inspect.getsource(render_func).encode('utf-8'))
+    except (OSError, TypeError):
+        h.update(render_func.__code__.co_code)
+    _update_hash(h, data)
+    return h.hexdigest()
+
+
+def _init_worker(setup):
+    matplotlib.use('Agg')
+    if setup is not None:
+        setup()
+
+
+def _render_task(args):
+    output_path, render_func, data = args
+    import matplotlib.pyplot as plt
+    try:
+        render_func(data, output_path)
+    finally:
+        plt.close('all')
+    return output_path
+
+
+# ==== 渲染一组图像 ====
+# setup 在每个渲染进程中调用一次，用于设置主题与中文字体；返回实际渲染的图像路径列表
+def render_figures(jobs, setup=None, workers=None, use_cache=True):
+    if workers is None:
+        workers = worker_count()
+
+    todo = []
+    hashes = {}
+    for output_path, render_func, data in jobs:
+        name = os.path.basename(output_path)
+        digest = figure_hash(render_func, data)
+        hashes[output_path] = digest
+        if use_cache and _read_digest(output_path) == digest and os.path.exists(output_path):
+            print(f"图像输入未变化，跳过：{name}")
+            continue
+        todo.append((output_path, render_func, data))
+
+    workers = max(1, min(workers, len(todo)))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(setup,)) as executor:
+            rendered = list(executor.map(_render_task, todo))
+    else:
+        _init_worker(setup)
+        rendered = [_render_task(task) for task in todo]
+
+    for output_path in rendered:
+        _write_digest(output_path, hashes[output_path])
+        print(f"已绘制完成：{os.path.basename(output_path)}")
+    return rendered
@@ -0,0 +1,69 @@
+import os
+import json
+import hashlib
+import tempfile
+
+
+# ==== 计算文件内容的 sha256（分块读取） ====
+def file_sha256(file_path, chunk_size=8 * 1024 * 1024):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ==== 文件的快速签名：大小 + 修改时间 ====
+def file_stat(file_path):
+    st = os.stat(file_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+# ==== 读取 / 保存 json 格式的清单文件 ====
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest_path, manifest):
+    atomic_write_text(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2))
+
+
+# ==== 原子写入文本文件 ====
+# 先写入同目录下的唯一临时文件再替换，多个进程同时写入时不会互相覆盖临时文件；
+# mkstemp 创建的文件权限为 0600，替换前改为与普通 open() 相同的 0666 & ~umask
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write_text(path, text):
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# ==== 判断文件是否与清单中的记录一致 ====
+# 大小和修改时间都未变化时直接认为未变；否则比较内容哈希。
+# 返回 (是否未变, 最新的文件记录)，记录中包含 size / mtime_ns / sha256
+def check_file(file_path, entry):
+    stat = file_stat(file_path)
+    if entry and entry.get('size') == stat['size'] and entry.get('mtime_ns') == stat['mtime_ns']:
+        return True, dict(stat, sha256=entry.get('sha256'))
+    sha = file_sha256(file_path)
+    unchanged = bool(entry) and entry.get('sha256') == sha
+    return unchanged, dict(stat, sha256=sha)
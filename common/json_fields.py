@@ -0,0 +1,62 @@
+import pandas as pd
+
+# 优先使用 orjson 加速解码，未安装时退回标准库 json
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+
+# ==== 解析字段描述：'avg_price' 为顶层字段，'items[].id' 为列表中每个元素的字段 ====
+def _parse_spec(field):
+    if '[].' in field:
+        key, sub = field.split('[].', 1)
+        return field, key, sub
+    return field, field, None
+
+
+# ==== 批量解码 purchase_history / login_history 等 JSON 列 ====
+# 只提取 fields 中列出的字段，返回 (DataFrame, 解析失败条数)；
+# numeric_fields 中的字段转换为 float64，缺失或无法转换时为 NaN；
+# string_fields 中的字段统一为 str（数字、布尔值转换为其字符串形式），缺失时为 None；
+# 列表字段（如 'items[].id'）每行为一个 list，解析失败时为空列表；
+# 标量字段的值若为 list / dict，按 None 处理并计为一条解析失败
+def decode_json_column(values, fields, numeric_fields=(), string_fields=()):
+    specs = [_parse_spec(f) for f in fields]
+    string_fields = set(string_fields)
+    columns = {f: [] for f in fields}
+    failures = 0
+
+    for raw in values:
+        try:
+            # 修复 CSV 中被转义成 "" 的双引号
+            obj = _json.loads(raw.replace('""', '"').strip())
+            if not isinstance(obj, dict):
+                raise TypeError("not a JSON object")
+        except (AttributeError, TypeError, ValueError):
+            failures += 1
+            obj = {}
+
+        malformed = False
+        for name, key, sub in specs:
+            value = obj.get(key)
+            if sub is not None:
+                if isinstance(value, list):
+                    value = [item.get(sub) for item in value if isinstance(item, dict)]
+                else:
+                    value = []
+            elif isinstance(value, (list, dict)):
+                value = None
+                malformed = True
+            elif name in string_fields and value is not None and not isinstance(value, str):
+                value = str(value)
+            columns[name].append(value)
+        failures += malformed
+
+    index = values.index if isinstance(values, pd.Series) else None
+    result = pd.DataFrame(columns, index=index)
+    for f in numeric_fields:
+        result[f] = pd.to_numeric(result[f], errors='coerce').astype('float64')
+    for f in string_fields:
+        result[f] = pd.Series(columns[f], index=result.index, dtype=object)
+    return result, failures
@@ -0,0 +1,47 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# 预处理输出文件后缀，parquet 优先于 csv
+PROCESSED_SUFFIXES = ('_processed.parquet', '_processed.csv')
+
+
+# ==== 列出预处理后的文件（同名文件优先使用 parquet） ====
+def list_processed_files(folder):
+    found = {}
+    for f in sorted(os.listdir(folder)):
+        for rank, suffix in enumerate(PROCESSED_SUFFIXES):
+            if f.endswith(suffix):
+                stem = f[:-len(suffix)]
+                if stem not in found or rank < found[stem][0]:
+                    found[stem] = (rank, f)
+    return [found[stem][1] for stem in sorted(found)]
+
+
+# ==== 读取预处理文件，只加载需要的列 ====
+def read_processed(file_path, columns=None):
+    if file_path.endswith('.parquet'):
+        return pd.read_parquet(file_path, columns=columns)
+    return pd.read_csv(file_path, usecols=columns)
+
+
+# ==== 读取某一列的最小值与最大值 ====
+# parquet 文件优先使用 footer 中的列统计信息，不读取数据页；没有统计信息或为 csv 时读取该列
+def column_min_max(file_path, column):
+    if file_path.endswith('.parquet'):
+        meta = pq.ParquetFile(file_path).metadata
+        col_idx = meta.schema.names.index(column)
+        lows, highs = [], []
+        for i in range(meta.num_row_groups):
+            stats = meta.row_group(i).column(col_idx).statistics
+            if stats is None or not stats.has_min_max:
+                break
+            lows.append(stats.min)
+            highs.append(stats.max)
+        else:
+            if lows:
+                return float(min(lows)), float(max(highs))
+            return np.nan, np.nan
+    values = read_processed(file_path, columns=[column])[column]
+    return float(values.min()), float(values.max())
@@ -0,0 +1,57 @@
+import os
+import ast
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ==== structured_transactions 的读取 ====
+# transaction.py 为每个输入文件写出一个 parquet 分片（structured_transactions/ 目录），
+# 也可能合并为单个 structured_transactions.parquet；分片目录存在时优先读取分片。
+# 旧版本输出的 structured_transactions.csv 仍可读取（需要逐行解析 main_categories）
+SHARD_DIR = 'structured_transactions'
+MERGED_FILE = 'structured_transactions.parquet'
+LEGACY_FILE = 'structured_transactions.csv'
+
+
+# ==== 列出分片文件（按文件名排序），没有分片时返回合并后的单个文件 ====
+def transaction_files(folder):
+    shard_dir = os.path.join(folder, SHARD_DIR)
+    if os.path.isdir(shard_dir):
+        shards = sorted(f for f in os.listdir(shard_dir) if f.endswith('.parquet'))
+        if shards:
+            return [os.path.join(shard_dir, f) for f in shards]
+    merged = os.path.join(folder, MERGED_FILE)
+    if os.path.exists(merged):
+        return [merged]
+    return [os.path.join(folder, LEGACY_FILE)]
+
+
+# ==== 读取全部交易记录为一个 arrow 表（不经过 pandas） ====
+def load_transaction_table(folder, columns=None):
+    tables = [pq.read_table(path, columns=columns) for path in transaction_files(folder)]
+    return pa.concat_tables(tables, promote_options='permissive')
+
+
+# ==== 读取 category_mask 的位序（即大类名称列表），旧版 csv 输出没有位掩码时返回 None ====
+def category_order(folder):
+    path = transaction_files(folder)[0]
+    if path.endswith('.csv'):
+        return None
+    metadata = pq.read_schema(path).metadata or {}
+    if b'main_categories' not in metadata:
+        return None
+    return json.loads(metadata[b'main_categories'].decode('utf-8'))
+
+
+# ==== 读取全部交易记录 ====
+def load_transactions(folder, columns=None):
+    files = transaction_files(folder)
+    if files[0].endswith('.csv'):
+        df = pd.read_csv(files[0], usecols=columns)
+        if 'main_categories' in df.columns:
+            df['main_categories'] = df['main_categories'].apply(ast.literal_eval)
+        if 'purchase_date' in df.columns:
+            df['purchase_date'] = pd.to_datetime(df['purchase_date'], errors='coerce')
+        return df
+    return load_transaction_table(folder, columns).to_pandas()
@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+from common.dataset import raw_folder
+
+# ==== 合成数据生成 ====
+# 按 preprocess.py 期望的 schema 生成 part-xxxxx.parquet，以及与之匹配的 product_catalog.json（写在同一目录中，
+# transaction.py 会优先使用数据目录中的商品目录）。可控制：
+#   duplicate_rate —— 重复 id 的比例（id 取自之前已生成的记录，可能跨文件）
+#   outlier_rate   —— age / income 的异常值比例（远超 3 倍标准差）
+#   missing_rate   —— income 缺失的比例
+#   unknown_item_rate —— 购买记录中引用不存在商品 ID 的比例
+# 每个文件使用独立的随机种子，结果可复现；文件之间并行生成
+SUBCATEGORIES = [
+    "智能手机", "笔记本电脑", "平板电脑", "智能手表", "耳机", "音响", "相机", "摄像机", "游戏机",
+    "上衣", "裤子", "裙子", "内衣", "鞋子", "帽子", "手套", "围巾", "外套",
+    "零食", "饮料", "调味品", "米面", "水产", "肉类", "蛋奶", "水果", "蔬菜",
+    "家具", "床上用品", "厨具", "卫浴用品", "文具", "办公用品", "健身器材", "户外装备",
+    "玩具", "模型", "益智玩具", "婴儿用品", "儿童课外读物", "车载电子", "汽车装饰",
+]
+PAYMENT_METHODS = ["现金", "微信支付", "支付宝", "储蓄卡", "信用卡", "银联", "云闪付"]
+PAYMENT_STATUS = ["已支付", "部分退款", "已退款"]
+COUNTRIES = ["中国", "美国", "日本", "英国", "法国", "德国", "俄罗斯", "巴西", "印度", "澳大利亚"]
+DEVICES = ["mobile", "desktop", "tablet"]
+LOCATIONS = ["home", "office", "travel"]
+SURNAMES = list("王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗")
+GIVEN_NAMES = list("伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂")
+
+
+# ==== 解析 100MB / 1GB / 10GB 这样的大小 ====
+def parse_size(text):
+    units = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4, 'B': 1}
+    text = text.strip().upper()
+    for unit, factor in units.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+# ==== 商品目录 ====
+def generate_catalog(catalog_path, num_products, seed):
+    rng = np.random.default_rng(seed)
+    products = [
+        {'id': i, 'category': SUBCATEGORIES[c], 'price': round(float(p), 2)}
+        for i, (c, p) in enumerate(zip(rng.integers(0, len(SUBCATEGORIES), num_products),
+                                       rng.lognormal(5, 1.2, num_products)))
+    ]
+    with open(catalog_path, 'w', encoding='utf-8') as f:
+        json.dump({'products': products}, f, ensure_ascii=False)
+
+
+# ==== 生成单个文件 ====
+# id 从 first_id 开始连续编号；重复记录的 id 从 [0, 当前最大 id) 中随机选取
+def generate_file(output_path, rows, first_id, seed, num_products, duplicate_rate, outlier_rate,
+                  missing_rate, unknown_item_rate, row_group_size=100_000):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(first_id, first_id + rows, dtype=np.int64)
+    dup = rng.random(rows) < duplicate_rate
+    if first_id + rows > 1:
+        ids[dup] = (rng.random(int(dup.sum())) * np.maximum(ids[dup], 1)).astype(np.int64)
+
+    age = np.clip(rng.normal(40, 12, rows), 18, 80)
+    income = rng.lognormal(11, 0.5, rows)
+    outlier = rng.random(rows) < outlier_rate
+    age[outlier & (rng.random(rows) < 0.5)] = rng.uniform(200, 500)
+    income[outlier] *= 50
+    income[rng.random(rows) < missing_rate] = np.nan
+
+    registration = np.datetime64('2015-01-01') + rng.integers(0, 3000, rows).astype('timedelta64[D]')
+    last_login = registration + rng.integers(0, 3000 * 86400, rows).astype('timedelta64[s]')
+    purchase_day = np.datetime64('2023-01-01') + rng.integers(0, 730, rows).astype('timedelta64[D]')
+
+    # 购买记录：1~5 个商品，少量引用不存在的商品 ID
+    n_items = rng.integers(1, 6, rows)
+    item_ids = rng.integers(0, num_products, int(n_items.sum()))
+    unknown = rng.random(len(item_ids)) < unknown_item_rate
+    item_ids[unknown] += num_products
+    bounds = np.concatenate([[0], np.cumsum(n_items)])
+    avg_price = np.round(rng.lognormal(6, 1.3, rows), 2)
+    methods = rng.integers(0, len(PAYMENT_METHODS), rows)
+    status = rng.choice(len(PAYMENT_STATUS), rows, p=[0.8, 0.1, 0.1])
+    purchase_history = [
+        '{"avg_price": %s, "items": [%s], "payment_method": "%s", '
+        '"payment_status": "%s", "purchase_date": "%s"}' % (
+            avg_price[i], ', '.join('{"id": %d}' % x for x in item_ids[bounds[i]:bounds[i + 1]]),
+            PAYMENT_METHODS[methods[i]], PAYMENT_STATUS[status[i]], purchase_day[i])
+        for i in range(rows)
+    ]
+
+    login_count = rng.integers(0, 200, rows)
+    session = np.round(rng.uniform(1, 120, rows), 1)
+    devices = rng.integers(0, len(DEVICES), rows)
+    locations = rng.integers(0, len(LOCATIONS), rows)
+    login_history = [
+        '{"avg_session_duration": %s, "devices": ["%s"], "first_login": "%s", "locations": ["%s"], '
+        '"login_count": %d}' % (session[i], DEVICES[devices[i]], registration[i], LOCATIONS[locations[i]],
+                                login_count[i])
+        for i in range(rows)
+    ]
+
+    surname = rng.integers(0, len(SURNAMES), rows)
+    given = rng.integers(0, len(GIVEN_NAMES), (rows, 2))
+    df = pd.DataFrame({
+        'id': ids,
+        'fullname': [SURNAMES[s] + GIVEN_NAMES[a] + GIVEN_NAMES[b] for s, (a, b) in zip(surname, given)],
+        'age': age,
+        'income': income,
+        'gender': rng.choice(['男', '女', '其他', '未指定'], rows, p=[0.48, 0.48, 0.02, 0.02]),
+        'country': rng.choice(COUNTRIES, rows),
+        'is_active': rng.random(rows) < 0.7,
+        'registration_date': registration.astype(str),
+        'last_login': last_login.astype('datetime64[s]').astype(str),
+        'purchase_history': purchase_history,
+        'login_history': login_history,
+    })
+    df.to_parquet(output_path, index=False, compression='snappy', row_group_size=row_group_size)
+    return os.path.getsize(output_path)
+
+
+def _generate_task(args):
+    return generate_file(*args)
+
+
+# ==== 生成一个完整的数据集，直到总大小达到 target_bytes ====
+# 先生成第一个文件估计每行字节数，再并行生成其余文件；返回数据集描述（写入 dataset.json）
+def generate_dataset(output_folder, target_bytes, rows_per_file=1_000_000, num_products=5000, seed=0,
+                     duplicate_rate=0.02, outlier_rate=0.005, missing_rate=0.01, unknown_item_rate=0.01,
+                     workers=None):
+    os.makedirs(output_folder, exist_ok=True)
+    for f in os.listdir(output_folder):
+        if f.startswith('part-') and f.endswith('.parquet'):
+            os.remove(os.path.join(output_folder, f))
+    generate_catalog(os.path.join(output_folder, 'product_catalog.json'), num_products, seed)
+    options = (num_products, duplicate_rate, outlier_rate, missing_rate, unknown_item_rate)
+
+    def task(idx, rows):
+        return (os.path.join(output_folder, f"part-{idx:05d}.parquet"), rows, idx * rows_per_file,
+                seed * 100_003 + idx + 1) + options
+
+    # 第一个文件用较少的行数估计每行大小，避免小数据集一次写出过多
+    first_rows = max(1000, min(rows_per_file, target_bytes // 400))
+    first_size = generate_file(*task(0, first_rows))
+    bytes_per_row = first_size / first_rows
+    remaining_rows = max(0, int((target_bytes - first_size) / bytes_per_row))
+    tasks = []
+    idx = 1
+    while remaining_rows > 0:
+        rows = min(rows_per_file, remaining_rows)
+        tasks.append(task(idx, rows))
+        remaining_rows -= rows
+        idx += 1
+
+    total_size = first_size
+    total_rows = first_rows + sum(t[1] for t in tasks)
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            total_size += sum(executor.map(_generate_task, tasks))
+
+    info = {
+        'files': 1 + len(tasks), 'rows': int(total_rows), 'bytes': int(total_size),
+        'target_bytes': int(target_bytes), 'seed': seed, 'rows_per_file': rows_per_file,
+        'num_products': num_products, 'duplicate_rate': duplicate_rate, 'outlier_rate': outlier_rate,
+        'missing_rate': missing_rate, 'unknown_item_rate': unknown_item_rate,
+    }
+    with open(os.path.join(output_folder, 'dataset.json'), 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+    return info
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="生成 preprocess.py 所需格式的合成数据与商品目录")
+    parser.add_argument('--size', default='100MB', help="目标数据量，如 100MB / 1GB / 10GB")
+    parser.add_argument('--dataset', default=None, help="数据集名称，写入 ../data/<名称>_data（缺省为 synthetic_<size>）")
+    parser.add_argument('--rows-per-file', type=int, default=1_000_000)
+    parser.add_argument('--products', type=int, default=5000, help="商品目录中的商品数")
+    parser.add_argument('--duplicate-rate', type=float, default=0.02)
+    parser.add_argument('--outlier-rate', type=float, default=0.005)
+    parser.add_argument('--missing-rate', type=float, default=0.01)
+    parser.add_argument('--unknown-item-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    dataset = args.dataset or f"synthetic_{args.size}"
+    output_folder = os.path.normpath(os.path.join(ROOT, 'code_1', raw_folder(dataset)))
+    info = generate_dataset(output_folder, parse_size(args.size), rows_per_file=args.rows_per_file,
+                            num_products=args.products, seed=args.seed, duplicate_rate=args.duplicate_rate,
+                            outlier_rate=args.outlier_rate, missing_rate=args.missing_rate,
+                            unknown_item_rate=args.unknown_item_rate, workers=args.workers)
+    print(f"已生成 {info['files']} 个文件，共 {info['rows']} 行，{info['bytes'] / 1024 ** 2:.1f} MB：{output_folder}")
+    print(f"数据集名称：{dataset}（运行 run_pipeline.py --dataset {dataset}）")
+    print(f"总耗时{time.time() - start_time:.2f} 秒")
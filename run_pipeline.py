@@ -0,0 +1,236 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+from common.dataset import DATA_ROOT, raw_folder, processed_folder, figs_folder
+from common.fingerprint import check_file, load_manifest, save_manifest
+
+# ==== 流水线阶段（DAG） ====
+# 每个阶段在自己的目录（cwd）中运行脚本，数据集规模通过环境变量 DATASET 传入。
+# inputs / outputs 为路径模板（{raw} / {processed} / {figs} / {data} 由数据集规模展开，可用通配符），
+# code 为阶段依赖的源码文件；输入与源码都未变化且输出都存在时跳过该阶段。
+# 上游阶段重新运行后，下游阶段按输入文件的内容哈希判断，内容未变时仍然跳过。
+# visualization 与 rule_* 写入同一图像目录并会并发运行，图像哈希按每张图单独保存（common/figures.py），互不覆盖。
+# 每个阶段通过环境变量 WORKERS / MEMORY_BUDGET_GB 得到总核数与总内存预算（--cpus / --memory-gb）的一份：
+# 份数为可能与它同时运行的阶段数（见 concurrency），同时运行的阶段的份额之和不超过总量，
+# 单独运行的 preprocess 仍使用全部核数与预算
+COMMON_CODE = ['common/dataset.py']
+STAGES = [
+    {'name': 'preprocess', 'cwd': 'code_1', 'script': 'preprocess.py', 'deps': [],
+     'code': ['code_1/preprocess.py', 'code_1/global_dedup.py', 'code_1/global_stats.py', 'code_1/moments.py',
+              'common/fingerprint.py'],
+     'inputs': ['{raw}/*.parquet'],
+     'outputs': ['{processed}/*_processed.*']},
+    {'name': 'quality', 'cwd': 'code_1', 'script': 'quality.py', 'deps': ['preprocess'],
+     'code': ['code_1/quality.py', 'common/processed_io.py', 'common/json_fields.py', 'common/fingerprint.py'],
+     'inputs': ['{processed}/*_processed.*'],
+     'outputs': ['{raw}/top*_high_quality_users.csv']},
+    {'name': 'visualization', 'cwd': 'code_1', 'script': 'visualization.py', 'deps': ['preprocess'],
+     'code': ['code_1/visualization.py', 'code_1/streaming_hist.py', 'common/processed_io.py', 'common/figures.py'],
+     'inputs': ['{processed}/*_processed.*'],
+     'outputs': ['{figs}/gender_distribution.png', '{figs}/country_distribution.png', '{figs}/age_distribution.png',
+                 '{figs}/income_distribution.png', '{figs}/registration_trend.png']},
+    {'name': 'transaction', 'cwd': 'code_2', 'script': 'transaction.py', 'deps': ['preprocess'],
+     'code': ['code_2/transaction.py', 'code_2/catalog_index.py', 'common/processed_io.py',
+              'common/json_fields.py', 'common/fingerprint.py'],
+     'inputs': ['{processed}/*_processed.*', '{data}/product_catalog.json', '{raw}/product_catalog.json'],
+     'outputs': ['{processed}/structured_transactions/*.parquet']},
+    {'name': 'rule_category', 'cwd': 'code_2', 'script': 'rule_category.py', 'deps': ['transaction'],
+     'code': ['code_2/rule_category.py', 'code_2/rule_mining.py', 'common/transactions_io.py', 'common/figures.py'],
+     'inputs': ['{processed}/structured_transactions/*.parquet'],
+     'outputs': ['{processed}/main_category_rules.csv']},
+    {'name': 'rule_payment', 'cwd': 'code_2', 'script': 'rule_payment.py', 'deps': ['transaction'],
+     'code': ['code_2/rule_payment.py', 'code_2/rule_mining.py', 'common/transactions_io.py', 'common/figures.py'],
+     'inputs': ['{processed}/structured_transactions/*.parquet'],
+     'outputs': ['{processed}/payment_to_category_rules.csv']},
+    {'name': 'rule_refund', 'cwd': 'code_2', 'script': 'rule_refund.py', 'deps': ['transaction'],
+     'code': ['code_2/rule_refund.py', 'code_2/rule_mining.py', 'common/transactions_io.py', 'common/figures.py'],
+     'inputs': ['{processed}/structured_transactions/*.parquet'],
+     'outputs': ['{processed}/refund_category_rules.csv']},
+    {'name': 'rule_time', 'cwd': 'code_2', 'script': 'rule_time.py', 'deps': ['transaction'],
+     'code': ['code_2/rule_time.py', 'code_2/rule_mining.py', 'code_2/transitions.py',
+              'code_2/external_sequences.py', 'common/transactions_io.py', 'common/figures.py'],
+     'inputs': ['{processed}/structured_transactions/*.parquet'],
+     'outputs': ['{processed}/category_transitions.csv', '{processed}/time_category_cube.csv']},
+]
+
+
+# ==== 展开路径模板（相对于脚本目录的 ../data 转换为仓库内的绝对路径） ====
+def expand(template, dataset):
+    base = os.path.join(ROOT, 'code_1')
+    folders = {
+        'data': DATA_ROOT, 'raw': raw_folder(dataset),
+        'processed': processed_folder(dataset), 'figs': figs_folder(dataset),
+    }
+    path = template.format(**{k: os.path.normpath(os.path.join(base, v)) for k, v in folders.items()})
+    return sorted(glob.glob(path))
+
+
+# ==== 阶段的全部输入文件（数据 + 源码） ====
+def stage_inputs(stage, dataset):
+    files = []
+    for template in stage['inputs']:
+        files.extend(expand(template, dataset))
+    for code_file in stage['code'] + COMMON_CODE:
+        files.append(os.path.join(ROOT, code_file))
+    return sorted(set(files))
+
+
+# ==== 判断阶段能否跳过，返回 (是否跳过, 新的输入清单) ====
+def check_stage(stage, dataset, state, force):
+    previous = state.get(stage['name'], {}).get('inputs', {})
+    entries = {}
+    unchanged = not force
+    for path in stage_inputs(stage, dataset):
+        key = os.path.relpath(path, ROOT)
+        same, entries[key] = check_file(path, previous.get(key))
+        unchanged = unchanged and same
+    unchanged = unchanged and set(entries) == set(previous) and len(entries) > 0
+    outputs_ready = all(expand(template, dataset) for template in stage['outputs'])
+    return unchanged and outputs_ready, entries
+
+
+# ==== 运行单个阶段，输出写入日志文件，返回 (是否成功, 耗时) ====
+def run_stage(stage, dataset, log_dir, workers, memory_gb):
+    start = time.time()
+    env = dict(os.environ, DATASET=dataset, MPLBACKEND='Agg', WORKERS=str(workers), MEMORY_BUDGET_GB=str(memory_gb))
+    log_path = os.path.join(log_dir, f"{stage['name']}.log")
+    with open(log_path, 'w', encoding='utf-8') as log:
+        result = subprocess.run([sys.executable, stage['script']], cwd=os.path.join(ROOT, stage['cwd']),
+                                env=env, stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode == 0, time.time() - start
+
+
+# ==== 选出目标阶段及其全部上游阶段 ====
+def select_stages(targets):
+    by_name = {s['name']: s for s in STAGES}
+    unknown = [t for t in targets if t not in by_name]
+    if unknown:
+        raise ValueError(f"未知的阶段：{', '.join(unknown)}，可选 {', '.join(by_name)}")
+    if not targets:
+        return list(STAGES)
+    needed, stack = set(), list(targets)
+    while stack:
+        name = stack.pop()
+        if name not in needed:
+            needed.add(name)
+            stack.extend(by_name[name]['deps'])
+    return [s for s in STAGES if s['name'] in needed]
+
+
+# ==== 每个阶段可能同时运行的阶段数：自身加上既不是其上游也不是其下游的阶段，不超过 jobs ====
+# 同时运行的 k 个阶段两两无依赖关系，各自的份数都不小于 k，份额之和不超过 1
+def concurrency(stages, jobs):
+    by_name = {s['name']: s for s in stages}
+    ancestors = {}
+    for stage in stages:
+        seen, stack = set(), list(stage['deps'])
+        while stack:
+            name = stack.pop()
+            if name in by_name and name not in seen:
+                seen.add(name)
+                stack.extend(by_name[name]['deps'])
+        ancestors[stage['name']] = seen
+    result = {}
+    for a in by_name:
+        unrelated = [b for b in by_name if b != a and b not in ancestors[a] and a not in ancestors[b]]
+        result[a] = min(jobs, 1 + len(unrelated))
+    return result
+
+
+# ==== 按依赖关系调度：依赖全部完成的阶段立即提交，互不依赖的阶段并发运行 ====
+def run_pipeline(dataset, targets=(), jobs=4, force=False, dry_run=False, cpus=None, memory_gb=16):
+    stages = select_stages(list(targets))
+    jobs = max(1, jobs)
+    total_cpus = cpus or os.cpu_count() or 1
+    shares = concurrency(stages, jobs)
+    pipeline_dir = os.path.normpath(os.path.join(ROOT, 'code_1', DATA_ROOT, '.pipeline', dataset))
+    os.makedirs(pipeline_dir, exist_ok=True)
+    state_path = os.path.join(pipeline_dir, 'state.json')
+    state = load_manifest(state_path)
+
+    names = {s['name'] for s in stages}
+    status = {}
+    running = {}
+    entries_of = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while len(status) < len(stages):
+            for stage in stages:
+                name = stage['name']
+                if name in status or name in running.values():
+                    continue
+                dep_status = [status.get(d) for d in stage['deps'] if d in names]
+                if any(s in ('failed', 'blocked') for s in dep_status):
+                    status[name] = 'blocked'
+                    print(f"[{name}] 上游阶段失败，跳过")
+                    continue
+                if any(s is None for s in dep_status):
+                    continue
+                if 'pending' in dep_status:
+                    status[name] = 'pending'
+                    print(f"[{name}] 需要运行（上游阶段需要运行）")
+                    continue
+                skip, entries = check_stage(stage, dataset, state, force)
+                if skip:
+                    # 内容哈希一致但大小 / 修改时间变化的输入，更新清单后下次只需比较 stat，不必重新哈希
+                    if entries != state[name]['inputs']:
+                        state[name]['inputs'] = entries
+                        save_manifest(state_path, state)
+                    status[name] = 'skipped'
+                    print(f"[{name}] 输入未变化，跳过")
+                    continue
+                if dry_run:
+                    status[name] = 'pending'
+                    print(f"[{name}] 需要运行")
+                    continue
+                print(f"[{name}] 开始运行")
+                future = executor.submit(run_stage, stage, dataset, pipeline_dir,
+                                         max(1, total_cpus // shares[name]), memory_gb / shares[name])
+                running[future] = name
+                entries_of[name] = entries
+
+            if not running:
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                ok, elapsed = future.result()
+                if ok:
+                    status[name] = 'done'
+                    # 记录运行前的输入清单；运行期间输入若被修改，下次运行时会再次检测到
+                    state[name] = {'inputs': entries_of.pop(name), 'finished': time.strftime('%Y-%m-%d %H:%M:%S')}
+                    save_manifest(state_path, state)
+                    print(f"[{name}] 完成，耗时 {elapsed:.2f} 秒")
+                else:
+                    status[name] = 'failed'
+                    print(f"[{name}] 失败，日志：{os.path.join(pipeline_dir, name + '.log')}")
+    return status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="按依赖关系运行数据处理与规则挖掘流水线")
+    parser.add_argument('stages', nargs='*', help="只运行这些阶段（及其上游阶段），缺省时运行全部")
+    parser.add_argument('--dataset', default='10G', help="数据集规模，如 10G / 30G")
+    parser.add_argument('--jobs', type=int, default=4, help="最多同时运行的阶段数")
+    parser.add_argument('--cpus', type=int, default=None, help="全部阶段合计使用的核数（缺省为本机核数），按并发阶段数分配")
+    parser.add_argument('--memory-gb', type=float, default=16, help="全部阶段合计的内存预算（GB），按并发阶段数分配")
+    parser.add_argument('--force', action='store_true', help="忽略缓存，重新运行所选阶段")
+    parser.add_argument('--dry-run', action='store_true', help="只显示哪些阶段需要运行")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    status = run_pipeline(args.dataset, args.stages, jobs=args.jobs, force=args.force, dry_run=args.dry_run,
+                          cpus=args.cpus, memory_gb=args.memory_gb)
+    print("\n阶段状态：")
+    for stage in STAGES:
+        if stage['name'] in status:
+            print(f"  {stage['name']:<14} {status[stage['name']]}")
+    print(f"总耗时{time.time() - start_time:.2f} 秒")
+    if any(s in ('failed', 'blocked') for s in status.values()):
+        sys.exit(1)